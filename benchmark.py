@@ -0,0 +1,190 @@
+import argparse
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import config
+from cleaning import clean_column
+from dedup import build_clusters
+from graph import ReplyGraph
+from matcher import match_queries, query_mask
+from metrics import all_counts, query_metric, tweet_trends
+from ranking import TweetRanking
+from sentiment import SentimentScorer
+from sketch import UserSketches
+from synthetic import STOPWORDS, generate_tweets
+from terms import build_terms, query_rows
+from utils import render_template
+
+
+"""
+==================================================================================
+Benchmark
+==================================================================================
+
+Time the dashboard computations on synthetic datasets of growing size and query
+count, so slowdowns are caught before a larger data dump is deployed:
+
+- match_queries      : query-match matrix of the tweet text
+- tweet_trends       : daily trends of every query
+- query_metric       : public metrics of every query
+- all_counts         : tweet and user counts of every query
+- user_sketches      : per-day user sketches of every query and their counts
+- reply_graph        : reply graph of the dataset, built once per dataset version
+- network_edges      : reply subgraph of every query, as in `get_node_edges`
+- term_matrix        : term frequencies of the dataset, built once per dataset version
+- text_cleaning      : cleaned text of the dataset
+- text_clusters      : near-duplicate clusters of the dataset, built once per dataset version
+- sentiment_scoring  : sentiment labels of the dataset with an empty memo
+- wordcloud_prep     : word frequencies of every query
+- tweet_details_prep : first page of tweet cards of every query
+
+Every case reports its median and best latency over the repeats and the peak memory
+allocated during one extra traced run. Results can be saved to csv and compared with
+an earlier run, the benchmark exits with status 1 when a case got slower than the
+tolerance.
+
+Usage:
+    python benchmark.py [--rows 100000 1000000 10000000] [--queries 1 5 10]
+                        [--out results.csv] [--baseline previous.csv] [--tolerance 0.2]
+
+"""
+
+QUERY_POOL = [
+    "prabowo", "anies", "ganjar", "jakarta", "korupsi",
+    "pilpres", "ridwan kamil", "vaksin", "#pemilu", "banjir",
+]
+
+
+def make_dataset(n_rows, seed=0):
+    # Same dtypes and order as the loaded dataset
+    n_users = max(n_rows // 20, 100)
+    chunks = [
+        generate_tweets(min(config.ROW_GROUP_SIZE, n_rows - first_row), n_users, seed, first_row)
+        for first_row in range(0, n_rows, config.ROW_GROUP_SIZE)
+    ]
+    df = pd.concat(chunks, ignore_index=True).astype(config.DATA_SCHEMA)
+    return df.set_index(config.DATE_COL)[config.LOAD_COLS].sort_index(kind="mergesort")
+
+
+def dataset_cases(df):
+    return {
+        "reply_graph": lambda: ReplyGraph.build(df),
+        "term_matrix": lambda: build_terms(df, STOPWORDS),
+        "text_cleaning": lambda: clean_column(df[config.TEXT_COL]),
+        "text_clusters": lambda: build_clusters(df),
+        "sentiment_scoring": lambda: SentimentScorer().score(df[config.TEXT_CLEAN_COL]),
+    }
+
+
+def query_cases(df, queries, graph, terms, template):
+    matches = match_queries(df[config.TEXT_COL], queries)
+    filters = [query_mask(matches, query) for query in queries]
+
+    def tweet_details_prep():
+        for filter in filters:
+            positions = np.flatnonzero(filter)
+            rows = TweetRanking(positions, df[config.REPLY_COL].to_numpy()[positions]).page(0, config.TWEETS_PER_PAGE)
+            page_df = df.iloc[rows]
+            render_template(template, {
+                "name": page_df[config.USERNAME_COL],
+                "date": pd.Series(page_df.index.strftime("%d %B %Y"), index=page_df.index),
+                "content": page_df[config.TEXT_COL],
+                "sentiment": page_df[config.SENTIMENT_COL],
+                "reply": page_df[config.REPLY_COL],
+                "retweet": page_df[config.RETWEET_COL],
+                "like": page_df[config.LIKE_COL],
+            })
+
+    return {
+        "match_queries": lambda: match_queries(df[config.TEXT_COL], queries),
+        "tweet_trends": lambda: tweet_trends("1D", queries, df, matches),
+        "query_metric": lambda: query_metric(queries, df, matches),
+        "all_counts": lambda: all_counts(df, queries, matches),
+        "user_sketches": lambda: UserSketches.build(df, queries, matches).counts(),
+        "network_edges": lambda: [graph.subgraph(filter) for filter in filters],
+        "wordcloud_prep": lambda: [terms.frequencies(query_rows(filter, df)) for filter in filters],
+        "tweet_details_prep": tweet_details_prep,
+    }
+
+
+def measure(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    # Peak memory of one traced run, tracing slows the run down
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"median_ms": 1000 * np.median(times), "best_ms": 1000 * min(times), "peak_mb": peak / 1024 ** 2}
+
+
+def run(sizes, query_counts, repeat=3, cases=None, seed=0):
+    with open(config.TWEET_TEMPLATE_PATH, "r") as template:
+        template = template.read()
+
+    results = []
+    for n_rows in sizes:
+        df = make_dataset(n_rows, seed)
+        graph, terms = ReplyGraph.build(df), build_terms(df, STOPWORDS)
+
+        benchmarks = [(0, dataset_cases(df))]
+        benchmarks += [
+            (n_queries, query_cases(df, QUERY_POOL[:n_queries], graph, terms, template))
+            for n_queries in query_counts
+        ]
+
+        for n_queries, funcs in benchmarks:
+            for case, func in funcs.items():
+                if cases and case not in cases:
+                    continue
+
+                result = {"rows": n_rows, "queries": n_queries, "case": case, **measure(func, repeat)}
+                results.append(result)
+                print(
+                    f"{n_rows:>10,} rows {n_queries:>3} queries {case:<20}"
+                    f"{result['median_ms']:>12.1f} ms {result['peak_mb']:>10.1f} MB",
+                    flush=True)
+
+    return pd.DataFrame(results)
+
+
+def compare(results, baseline, tolerance):
+    keys = ["rows", "queries", "case"]
+    merged = results.merge(baseline[keys + ["median_ms"]], on=keys, suffixes=("", "_baseline"))
+    merged["ratio"] = merged["median_ms"] / merged["median_ms_baseline"]
+    return merged[merged["ratio"] > 1 + tolerance]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard computations on synthetic tweets")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--queries", type=int, nargs="+", default=[1, 5, 10])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--cases", nargs="+", default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    # Time the computations without the span bookkeeping
+    config.TELEMETRY = False
+    results = run(args.rows, args.queries, args.repeat, args.cases, args.seed)
+    if args.out:
+        results.to_csv(args.out, index=False)
+
+    if args.baseline:
+        regressions = compare(results, pd.read_csv(args.baseline), args.tolerance)
+        if len(regressions):
+            print("\nSlower than the baseline:")
+            print(regressions.to_string(index=False))
+            sys.exit(1)
@@ -0,0 +1,155 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+
+import numpy as np
+import pandas as pd
+
+import config
+
+
+"""
+==================================================================================
+Result Cache
+==================================================================================
+
+In-memory cache for loaders and helpers, shared by every session of the server.
+Results are keyed by the function, a cheap dataset version fingerprint (size and
+modification time of the dataset file) and the normalized arguments. DataFrame and
+Series arguments are never hashed, they are assumed to be the loaded dataset and are
+identified by the dataset version only. So only decorate functions whose pandas
+arguments are the dataset itself or one of its columns.
+
+The cache holds at most `config.CACHE_MAX_BYTES` and evicts the least recently used
+results first. The newest result is always kept, even when it is larger than the
+budget on its own.
+
+"""
+
+DATASET_KEY = "<dataset>"
+
+
+def data_path():
+    if os.path.exists(config.COLUMNAR_PATH):
+        return config.COLUMNAR_PATH
+    return config.DATA_PATH
+
+
+def dataset_version(path=None):
+    stat = os.stat(path or data_path())
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+@contextmanager
+def replacing(path, mode="wb"):
+    # Write a temporary file and replace the target at once, readers and memory maps keep the old file
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, mode) as temp_file:
+            yield temp_file
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def normalize_arg(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return DATASET_KEY
+    if isinstance(value, np.ndarray):
+        return (value.shape, value.dtype.str, hash(value.tobytes()))
+    if isinstance(value, (list, tuple)):
+        return tuple(normalize_arg(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, normalize_arg(item)) for key, item in value.items()))
+    return value
+
+
+def sizeof(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(sizeof(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sizeof(key) + sizeof(item) for key, item in value.items())
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return True, self.entries[key][0]
+
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        size = sizeof(value)
+        with self.lock:
+            if key in self.entries:
+                self.total_bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (value, size)
+            self.total_bytes += size
+
+            # Evict least recently used results, keep the newest one
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            requests = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+RESULT_CACHE = ResultCache(config.CACHE_MAX_BYTES)
+
+
+def cached(func):
+    name = f"{func.__module__}.{func.__qualname__}"
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        key = (name, dataset_version(), normalize_arg(args), normalize_arg(kwargs))
+        found, value = RESULT_CACHE.get(key)
+        if not found:
+            value = func(*args, **kwargs)
+            RESULT_CACHE.put(key, value)
+
+        return value
+
+    return wrapper
@@ -0,0 +1,110 @@
+import re
+from functools import lru_cache
+
+import nltk
+import numpy as np
+import pandas as pd
+from nltk.corpus import stopwords
+
+import config
+from executor import map_queries
+
+
+"""
+==================================================================================
+Text Cleaning
+==================================================================================
+
+Produce `full_text_cleaned` from `full_text` inside the project:
+- urls, mentions, emoji and the `#` of hashtags are removed
+- text is casefolded and split into words, punctuation separates words
+- slang and abbreviations are replaced from the table at `config.SLANG_PATH`
+- stopwords are removed, the nltk Indonesian list plus `EXTRA_STOPWORDS`, except the
+  sentiment negations, which flip the score of the next word (see `sentiment`)
+
+The cleaned column is the space separated token stream that the word cloud terms,
+the token index, sentiment scoring and the near-duplicate clusters read. Patterns are
+compiled once and word lookups use frozensets and dicts, texts are cleaned in batches
+of `CLEAN_BATCH` on the process pool. `split_words` splits a batch of cleaned texts
+into vocabulary codes with a single string split.
+
+"""
+
+STRIP_PATTERN = re.compile(r"https?://\S+|www\.\S+|@\w+|[\U0001F000-\U0001FAFF\u2600-\u27BF\u2B00-\u2BFF\uFE0F\u200D]")
+WORD_PATTERN = re.compile(r"[^\W_]+")
+EXTRA_STOPWORDS = frozenset(["yg", "nya", "rt", "amp"])
+NEGATIONS = frozenset("tidak tak bukan belum jangan gak ga enggak nggak tdk gk".split())
+TEXT_SEPARATOR = "\x01"
+CLEAN_BATCH = 20_000
+
+
+@lru_cache(maxsize=None)
+def load_stopword_set():
+    # Only download the corpus when it is missing
+    try:
+        words = stopwords.words("indonesian")
+    except LookupError:
+        nltk.download("stopwords", quiet=True)
+        words = stopwords.words("indonesian")
+
+    return frozenset(words) | EXTRA_STOPWORDS
+
+
+@lru_cache(maxsize=None)
+def load_clean_stopword_set():
+    # Negations stay in the cleaned text, word cloud terms still use the full stopword set
+    return load_stopword_set() - NEGATIONS
+
+
+@lru_cache(maxsize=None)
+def load_slang(path=config.SLANG_PATH):
+    slang = pd.read_csv(path, sep="\t", keep_default_na=False)
+    return dict(zip(slang["slang"], slang["word"]))
+
+
+def clean_texts(texts):
+    stopword_set, slang = load_clean_stopword_set(), load_slang()
+
+    cleaned = []
+    for text in texts:
+        if not isinstance(text, str):
+            cleaned.append("")
+            continue
+
+        words = WORD_PATTERN.findall(STRIP_PATTERN.sub(" ", text).casefold())
+        words = [slang.get(word, word) for word in words]
+        cleaned.append(" ".join(word for word in words if word not in stopword_set))
+
+    return cleaned
+
+
+def split_words(texts):
+    # Split all texts at once, a separator word marks the start of the next text
+    words = f" {TEXT_SEPARATOR} ".join(texts).split()
+    codes, vocab = pd.factorize(np.array(words, dtype=object))
+    is_separator = np.array([word == TEXT_SEPARATOR for word in vocab], dtype=bool)[codes]
+
+    # Vocabulary codes of the words and the text each word belongs to
+    positions = np.cumsum(is_separator)[~is_separator]
+    return codes[~is_separator], vocab, positions
+
+
+def clean_column(texts):
+    texts = list(texts)
+    batches = [texts[start:start + CLEAN_BATCH] for start in range(0, len(texts), CLEAN_BATCH)]
+    cleaned = map_queries(clean_texts, batches, kind=config.CPU_EXECUTOR)
+    return np.array([text for batch in cleaned for text in batch], dtype=object)
+
+
+def fill_cleaned(df, reclean=False):
+    # Clean the tweets without a cleaned text
+    if config.TEXT_CLEAN_COL not in df:
+        df[config.TEXT_CLEAN_COL] = None
+
+    missing = df[config.TEXT_CLEAN_COL].isna().to_numpy() | reclean
+    if missing.any():
+        cleaned = df[config.TEXT_CLEAN_COL].to_numpy(dtype=object, copy=True)
+        cleaned[missing] = clean_column(df[config.TEXT_COL][missing])
+        df[config.TEXT_CLEAN_COL] = cleaned
+
+    return df
@@ -1,13 +1,58 @@
 # File Path
 DATA_PATH = "src/csv/labeled.csv"
+COLUMNAR_PATH = "src/parquet/labeled.parquet"
+INDEX_PATH = "src/index"
+CUBE_PATH = "src/cube/cube.pkl"
+STORE_PATH = "src/store/results.sqlite"
 TWEET_TEMPLATE_PATH = "src/template/tweet.html"
 TWEET_STYLE_PATH = "src/template/tweet_style.html"
+WORDCLOUD_MASK_PATH = "src/images/twitter.jpg"
+SENTIMENT_LEXICON_PATH = "src/lexicon/sentiment.tsv"
+SLANG_PATH = "src/lexicon/slang.tsv"
+
+# Shared Dataset, every server process maps one copy of the dataset from shared memory
+SHARED_DATASET = False
+SHARED_DATA_DIR = "/dev/shm/social_analysis"
+
+# Telemetry, DEBUG_PANEL shows the spans of the last page run on the sidebar and needs TELEMETRY
+TELEMETRY = False
+DEBUG_PANEL = False
+TELEMETRY_PATH = "src/telemetry/spans.jsonl"
+TELEMETRY_MAX_BYTES = 64 * 1024 ** 2
+TELEMETRY_METRICS_PATH = "src/telemetry/metrics.prom"
+
+# Streaming, aggregate the dataset chunk by chunk instead of loading it in memory
+STREAMING = False
+
+# Live Ingest, LIVE_FEED is a JSONL file path or "tcp://host:port", None turns it off.
+# The feed extends the loaded dataset and is ignored in streaming mode
+LIVE_FEED = None
+LIVE_BATCH_SIZE = 1000
+LIVE_POLL_SECONDS = 1
+LIVE_REFRESH_SECONDS = 30
+LIVE_MAX_VIEWS = 32
+
+# Near-Duplicate Clusters, texts at least this similar share one cluster, 1.0 joins identical texts only
+DEDUP_SIMILARITY = 0.8
+
+# User Sketches, user counts of date ranges are estimated from per-day sketches
+USER_SKETCHES = False
+
+# Result Cache
+CACHE_MAX_BYTES = 512 * 1024 ** 2
+
+# Query Executor, CPU_EXECUTOR is "thread" or "process" and None workers uses every core
+CPU_EXECUTOR = "thread"
+EXECUTOR_WORKERS = None
 
 # Twitter Parameters
 METRIC_COLS = ["retweet_count", "reply_count", "like_count", "quote_count"]
-COUNT_ANALYSIS_COLS = ["viral_count", "influencer_count", "sensitive_count"]
+COUNT_ANALYSIS_COLS = ["viral_count", "users_count", "influencer_count", "sensitive_count"]
 COUNT_SENTIMENT_COLS = ["positive_sentiment_count", "negative_sentiment_count"]
 USER_INVOLVEMENT_COLS = ["interactions", "potential_users_reached"]
+INFLUENCE_TOP_K = 10
+NETWORK_MAX_NODES = 300
+TWEETS_PER_PAGE = 30
 TWEET_COUNT_COL = "tweets_count"
 DATE_COL = "created_at"
 TEXT_COL = "full_text"
@@ -21,6 +66,31 @@ RETWEET_COL = "retweet_count"
 QUOTE_COL = "quote_count"
 SENSITIVE_COL = "possibly_sensitive"
 SENTIMENT_COL = "sentiment"
+REPLY_TO_USERNAME_COL = "in_reply_to_screen_name"
+REPLY_TO_ID_COL = "in_reply_to_status_id_str"
+ID_COL = "id_str"
+
+
+# Columnar Dataset Schema
+DATA_SCHEMA = {
+    ID_COL: "int64",
+    TEXT_COL: "object",
+    TEXT_CLEAN_COL: "object",
+    USER_ID_COL: "int64",
+    USERNAME_COL: "category",
+    USER_FOLLOWERS_COL: "int32",
+    RETWEET_COL: "int32",
+    REPLY_COL: "int32",
+    LIKE_COL: "int32",
+    QUOTE_COL: "int32",
+    SENSITIVE_COL: "bool",
+    SENTIMENT_COL: "category",
+    REPLY_TO_USERNAME_COL: "category",
+    REPLY_TO_ID_COL: "Int64",
+}
+ID_COLS = [ID_COL, USER_ID_COL, REPLY_TO_ID_COL]
+LOAD_COLS = [col for col in DATA_SCHEMA if col not in (ID_COL, REPLY_TO_ID_COL)]
+ROW_GROUP_SIZE = 100_000
 
 
 # Bokeh Plot Additional Column
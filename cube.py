@@ -0,0 +1,196 @@
+import os
+import pickle
+import threading
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+import config
+from cache import data_path, dataset_version, replacing
+from matcher import match_queries, normalize_query
+from utils import replace_wspace
+
+
+"""
+==================================================================================
+Tweet Cube
+==================================================================================
+
+Materialized aggregates keyed by (hourly bucket, query). Every cell stores the tweet
+count and the sum of each public metric of the tweets matching the query in that
+hour. Daily and weekly trends are rolled up from the hourly cells, and query metrics
+are the sum of all cells of a query, so a dashboard refresh reads cube cells instead
+of the raw tweets.
+
+The cube belongs to the dataset file it was built from (see `cache.data_path`) and
+its version. It remembers how many bytes of the csv it has consumed, when new rows
+are appended to the csv, only those rows are read and added to the existing cells.
+Any other change, a rewritten csv or a columnar dataset, rebuilds the cube. Queries
+that are not in the cube yet are computed once from the raw DataFrame.
+
+"""
+
+BUCKET_PERIOD = "1H"
+CUBE_COLS = [config.TWEET_COUNT_COL] + config.METRIC_COLS
+TAIL_BYTES = 256
+
+
+def aggregate_cells(df, queries, matches):
+    rows, cols = np.nonzero(matches[queries].to_numpy())
+
+    # One record for every (tweet, query) match
+    records = df[config.METRIC_COLS].iloc[rows].fillna(0)
+    records.insert(0, config.TWEET_COUNT_COL, 1)
+    records["bucket"] = df.index[rows].floor(BUCKET_PERIOD)
+    records["query"] = np.array([normalize_query(query) for query in queries], dtype=object)[cols]
+
+    return records.groupby(["bucket", "query"]).sum().astype(np.int64)
+
+
+def read_tail(path, offset):
+    with open(path, "rb") as data:
+        data.seek(max(offset - TAIL_BYTES, 0))
+        return data.read(offset - max(offset - TAIL_BYTES, 0))
+
+
+class TweetCube:
+
+    def __init__(self, cells, start, end, path, version, offset, tail):
+        self.cells = cells
+        self.start = start
+        self.end = end
+        self.path = path
+        self.version = version
+        self.offset = offset
+        self.tail = tail
+        self.lock = threading.RLock()
+
+    def __sizeof__(self):
+        return int(self.cells.memory_usage(deep=True).sum()) + len(self.tail)
+
+    @classmethod
+    def empty(cls, df, path=None):
+        path = path or data_path()
+        version = dataset_version(path)
+        index = pd.MultiIndex.from_arrays([pd.DatetimeIndex([]), []], names=["bucket", "query"])
+        cells = pd.DataFrame(columns=CUBE_COLS, index=index, dtype=np.int64)
+        offset = os.path.getsize(path)
+        return cls(cells, df.index.min(), df.index.max(), path, version, offset, read_tail(path, offset))
+
+    @property
+    def queries(self):
+        return set(self.cells.index.get_level_values("query"))
+
+    def missing(self, queries):
+        # One query per cube key, queries that differ in case only share their cells
+        cube_queries, keys = self.queries, {}
+        for query in queries:
+            keys.setdefault(normalize_query(query), query)
+        return [query for key, query in keys.items() if key not in cube_queries]
+
+    def add(self, df, queries, matches):
+        cells = aggregate_cells(df, queries, matches)
+        with self.lock:
+            self.cells = self.cells.add(cells, fill_value=0).astype(np.int64)
+
+    def add_missing(self, df, queries, match):
+        # Check and add under one lock, so concurrent sessions add a new query once
+        with self.lock:
+            missing = self.missing(queries)
+            if missing:
+                self.add(df, missing, match(missing, df))
+        return missing
+
+    def append(self, path=None):
+        path = path or data_path()
+        version = dataset_version(path)
+
+        # The cube was built from another dataset file
+        if path != self.path:
+            return False
+        if version == self.version:
+            return True
+
+        # Only rows appended to the csv are added, any other change rebuilds the cube
+        size = os.path.getsize(path)
+        if path != config.DATA_PATH or size < self.offset or read_tail(path, self.offset) != self.tail:
+            return False
+        if size == self.offset:
+            self.version = version
+            return True
+
+        # Read only the newly appended rows, up to the size checked above
+        header = pd.read_csv(path, nrows=0).columns
+        with open(path, "rb") as data:
+            data.seek(self.offset)
+            appended = BytesIO(data.read(size - self.offset))
+        df = pd.read_csv(appended, names=header, parse_dates=[config.DATE_COL], index_col=config.DATE_COL)
+
+        queries = sorted(self.queries)
+        if len(df) > 0 and len(queries) > 0:
+            self.add(df, queries, match_queries(df[config.TEXT_COL], queries))
+
+        with self.lock:
+            self.start = min(self.start, df.index.min()) if len(df) > 0 else self.start
+            self.end = max(self.end, df.index.max()) if len(df) > 0 else self.end
+            self.version = version
+            self.offset = size
+            self.tail = read_tail(path, size)
+
+        return True
+
+    def query_cells(self, queries):
+        keys = [normalize_query(query) for query in queries]
+        cells = self.cells[self.cells.index.get_level_values("query").isin(keys)]
+        return cells, keys
+
+    def trends(self, period, queries):
+        cells, keys = self.query_cells(queries)
+
+        # Roll up hourly cells into the requested period
+        counts = cells[config.TWEET_COUNT_COL].unstack("query", fill_value=0)
+        counts = counts.reindex(columns=keys, fill_value=0)
+        buckets = pd.Series(0, index=[self.start, self.end]).resample(period).sum().index
+        trends = counts.resample(period).sum().reindex(buckets, fill_value=0).astype(np.int64)
+
+        # Change column names and index
+        trends.columns = [replace_wspace(query) for query in queries]
+        trends.index.name = config.DATE_COL
+        trends["date"] = trends.index
+
+        return trends
+
+    def metrics(self, queries):
+        cells, keys = self.query_cells(queries)
+        totals = cells[config.METRIC_COLS].groupby(level="query").sum()
+        totals = totals.reindex(keys, fill_value=0).astype(np.int64)
+        totals.index = queries
+
+        return totals
+
+    def save(self, path=config.CUBE_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self.lock, replacing(path) as cube_file:
+            pd.to_pickle({
+                "cells": self.cells,
+                "start": self.start,
+                "end": self.end,
+                "path": self.path,
+                "version": self.version,
+                "offset": self.offset,
+                "tail": self.tail
+            }, cube_file)
+
+    @classmethod
+    def load(cls, path=config.CUBE_PATH):
+        try:
+            state = pd.read_pickle(path)
+        except (OSError, ValueError, KeyError, EOFError, pickle.UnpicklingError):
+            return None
+
+        # Cubes saved without their dataset file are rebuilt
+        try:
+            return cls(**state)
+        except TypeError:
+            return None
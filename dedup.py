@@ -0,0 +1,162 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+import config
+from cache import replacing
+from cleaning import split_words
+
+
+"""
+==================================================================================
+Near-Duplicate Clusters
+==================================================================================
+
+Group copy-pasted tweets and retweets by their `full_text_cleaned`. Identical texts
+form one cluster, then texts whose word 3-gram sets have an estimated Jaccard
+similarity of at least `config.DEDUP_SIMILARITY` are joined:
+
+- every unique text gets a MinHash signature of `NUM_PERM` hashes of its 3-grams
+- signatures are split into `BANDS` bands, texts with an equal band are candidates
+- candidates are kept when their signatures agree on the similarity threshold, and
+  clusters are the connected components of the kept pairs
+
+A similarity of 1.0 only groups identical texts. Clusters are numbered by their first
+row, every cluster keeps its first row as representative and its row count as weight.
+
+Per-row counts and metrics still read every row, so they stay exact. Text heavy work
+stores one text per cluster, e.g. the word cloud term matrix has one row per cluster
+and sums the representative terms weighted by the selected rows of each cluster, near
+duplicates are counted with the terms of their representative.
+
+"""
+
+SHINGLE_SIZE = 3
+NUM_PERM = 64
+BANDS = 16
+CLUSTERS_FORMAT = 1
+MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+class TextClusters:
+
+    def __init__(self, labels, version=None):
+        self.labels = labels
+        self.version = version
+        self.representatives = np.unique(labels, return_index=True)[1]
+        self.weights = np.bincount(labels, minlength=len(self.representatives))
+
+    def __sizeof__(self):
+        return self.labels.nbytes + self.representatives.nbytes + self.weights.nbytes
+
+    def collapse(self, rows):
+        # Clusters of the given rows and how many of the rows each one holds
+        return np.unique(self.labels[rows], return_counts=True)
+
+    def save(self, path):
+        # Replace the files at once, readers never see a partial file
+        os.makedirs(path, exist_ok=True)
+        with replacing(os.path.join(path, "clusters.npy")) as labels_file:
+            np.save(labels_file, self.labels)
+
+        with replacing(os.path.join(path, "clusters_meta.json"), "w") as meta_file:
+            json.dump({"version": self.version, "format": CLUSTERS_FORMAT}, meta_file)
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(os.path.join(path, "clusters_meta.json"), "r") as meta_file:
+                meta = json.load(meta_file)
+            if meta.get("format") != CLUSTERS_FORMAT:
+                return None
+
+            labels = np.load(os.path.join(path, "clusters.npy"))
+        except (OSError, ValueError, KeyError):
+            return None
+
+        return cls(labels, version=meta["version"])
+
+
+def shingle_hashes(texts):
+    codes, _, positions = split_words(texts)
+    codes = codes.astype(np.uint64)
+
+    # Word 3-grams inside one text, texts with fewer words use their single words
+    n_words = np.bincount(positions, minlength=len(texts))
+    with np.errstate(over="ignore"):
+        grams = codes[:len(codes) - SHINGLE_SIZE + 1].copy() if len(codes) >= SHINGLE_SIZE else codes[:0]
+        for offset in range(1, SHINGLE_SIZE):
+            grams = grams * MIX + codes[offset:len(codes) - SHINGLE_SIZE + 1 + offset]
+
+    gram_texts = positions[:len(grams)]
+    same_text = gram_texts == positions[SHINGLE_SIZE - 1:]
+    short = n_words[positions] < SHINGLE_SIZE
+
+    hashes = np.r_[grams[same_text], codes[short]]
+    owners = np.r_[gram_texts[same_text], positions[short]]
+    order = np.argsort(owners, kind="stable")
+    return hashes[order], owners[order]
+
+
+def minhash_signatures(texts, seed=0):
+    hashes, owners = shingle_hashes(texts)
+    rng = np.random.default_rng(seed)
+    multipliers = rng.integers(1, 2 ** 63, NUM_PERM, dtype=np.uint64) | np.uint64(1)
+    offsets = rng.integers(0, 2 ** 63, NUM_PERM, dtype=np.uint64)
+
+    # Texts without words keep the empty signature
+    signatures = np.full((len(texts), NUM_PERM), np.iinfo(np.uint64).max, dtype=np.uint64)
+    if len(hashes) == 0:
+        return signatures
+
+    starts = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+    with np.errstate(over="ignore"):
+        for perm in range(NUM_PERM):
+            permuted = hashes * multipliers[perm] + offsets[perm]
+            signatures[owners[starts], perm] = np.minimum.reduceat(permuted, starts)
+
+    return signatures
+
+
+def similar_pairs(signatures, similarity):
+    rows = NUM_PERM // BANDS
+    pairs = []
+    for band in range(BANDS):
+        keys = signatures[:, band * rows]
+        with np.errstate(over="ignore"):
+            for col in range(band * rows + 1, (band + 1) * rows):
+                keys = keys * MIX + signatures[:, col]
+
+        # Neighbours in key order share a bucket
+        order = np.argsort(keys, kind="stable")
+        same = np.flatnonzero(keys[order[1:]] == keys[order[:-1]])
+        pairs.append(np.column_stack([order[same], order[same + 1]]))
+
+    pairs = np.concatenate(pairs)
+    if len(pairs) == 0:
+        return pairs
+    pairs = np.unique(pairs, axis=0)
+
+    # Keep candidates whose signatures agree often enough
+    agreement = (signatures[pairs[:, 0]] == signatures[pairs[:, 1]]).mean(axis=1)
+    return pairs[agreement >= similarity]
+
+
+def build_clusters(df, version=None, similarity=None):
+    similarity = config.DEDUP_SIMILARITY if similarity is None else similarity
+    codes, texts = pd.factorize(df[config.TEXT_CLEAN_COL].fillna("").str.lower())
+
+    # Join the unique texts that are near duplicates
+    components = np.arange(len(texts))
+    if similarity < 1 and len(texts) > 1:
+        pairs = similar_pairs(minhash_signatures(list(texts)), similarity)
+        graph = sparse.coo_matrix((np.ones(len(pairs)), (pairs[:, 0], pairs[:, 1])), shape=(len(texts), len(texts)))
+        _, components = connected_components(graph, directed=False)
+
+    # Number the clusters by their first row
+    labels, _ = pd.factorize(components[codes])
+    return TextClusters(labels.astype(np.int64), version=version)
@@ -0,0 +1,54 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+import config
+
+
+"""
+==================================================================================
+Query Executor
+==================================================================================
+
+Fan out independent per-query work over a worker pool, results are returned in
+query order. Two pools are shared by every session:
+
+- thread  : work that reads the loaded dataset, no data is copied to the workers
+- process : CPU bound work on small inputs such as texts or word frequencies, the
+            function and its arguments must be picklable
+
+`config.CPU_EXECUTOR` decides which pool runs the CPU bound work and
+`config.EXECUTOR_WORKERS` sets the size of both pools. Worker processes are started
+by a fork server (spawned where there is none), never forked from the multi-threaded
+server process.
+
+"""
+
+START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+POOL_TYPES = {
+    "thread": ThreadPoolExecutor,
+    "process": partial(ProcessPoolExecutor, mp_context=multiprocessing.get_context(START_METHOD)),
+}
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+def get_pool(kind):
+    with pools_lock:
+        if kind not in pools:
+            pools[kind] = POOL_TYPES[kind](max_workers=config.EXECUTOR_WORKERS)
+        return pools[kind]
+
+
+def map_queries(func, items, kind="thread", **kwargs):
+    items = list(items)
+    if kwargs:
+        func = partial(func, **kwargs)
+
+    # Not worth a round trip to the pool
+    if len(items) <= 1 or config.EXECUTOR_WORKERS == 1:
+        return [func(item) for item in items]
+
+    return list(get_pool(kind).map(func, items))
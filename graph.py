@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+
+import config
+
+
+"""
+==================================================================================
+Reply Graph
+==================================================================================
+
+Directed graph of replies, an edge goes from the replied user
+(`in_reply_to_screen_name`) to the user who replied (`user.screen_name`). Every reply
+tweet is one edge, so an edge points back to the row of its tweet.
+
+User names are interned once into a sorted table and the edges are stored as CSR
+adjacency arrays grouped by source user:
+- indptr  : edges of source user `i` are `indptr[i]:indptr[i + 1]`
+- targets : target user id of every edge
+- rows    : row of the reply tweet of every edge
+
+A query subgraph is a vectorized mask over the edge rows, parallel edges are merged
+into one edge weighted by the number of replies. Rendered networks are pruned to a
+node budget by keeping the heaviest edges.
+
+"""
+
+MAX_SOURCES = 100
+MAX_TARGETS = 3
+
+
+def user_codes(values, users):
+    # Map the categories once instead of every row
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        lookup = np.append(users.get_indexer(values.cat.categories.astype(str)), -1)
+        return lookup[values.cat.codes.to_numpy()]
+
+    return users.get_indexer(values)
+
+
+def group_starts(keys):
+    # First position of every run of equal keys
+    return np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.array([], dtype=np.int64)
+
+
+class ReplyGraph:
+
+    def __init__(self, users, followers, indptr, targets, rows):
+        self.users = users
+        self.followers = followers
+        self.indptr = indptr
+        self.targets = targets
+        self.rows = rows
+        self.sources = np.repeat(np.arange(len(users), dtype=np.int32), np.diff(indptr))
+
+    def __sizeof__(self):
+        arrays = (self.followers, self.indptr, self.targets, self.rows, self.sources)
+        return self.users.memory_usage(deep=True) + sum(array.nbytes for array in arrays)
+
+    @classmethod
+    def build(cls, df):
+        replied = df[config.REPLY_TO_USERNAME_COL]
+        authors = df[config.USERNAME_COL]
+
+        # Intern the user names of both columns
+        names = [np.asarray(col.dropna().unique(), dtype=str) for col in (replied, authors)]
+        users = pd.Index(np.union1d(*names))
+        sources, targets = user_codes(replied, users), user_codes(authors, users)
+
+        # Followers of every user, users who never tweeted have none
+        followers = np.zeros(len(users), dtype=np.int64)
+        known = targets >= 0
+        np.maximum.at(followers, targets[known], df[config.USER_FOLLOWERS_COL].fillna(0).to_numpy(np.int64)[known])
+
+        # Group the reply edges by source user
+        rows = np.flatnonzero((sources >= 0) & known)
+        rows = rows[np.argsort(sources[rows], kind="stable")]
+        indptr = np.zeros(len(users) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(sources[rows], minlength=len(users)))
+
+        return cls(users, followers, indptr, targets[rows].astype(np.int32), rows)
+
+    def query_edges(self, filter):
+        mask = filter[self.rows]
+        n_users = len(self.users)
+
+        # Merge parallel edges, unique keys are sorted by source
+        keys = self.sources[mask].astype(np.int64) * n_users + self.targets[mask]
+        keys, weights = np.unique(keys, return_counts=True)
+        return keys // n_users, keys % n_users, weights
+
+    def subgraph(self, filter, max_sources=MAX_SOURCES, max_targets=MAX_TARGETS):
+        sources, targets, weights = self.query_edges(filter)
+
+        # Keep the most replied sources
+        starts = group_starts(sources)
+        totals = np.add.reduceat(weights, starts) if len(starts) else weights
+        top = sources[starts[np.argsort(-totals, kind="stable")[:max_sources]]]
+        keep = np.isin(sources, top)
+        sources, targets, weights = sources[keep], targets[keep], weights[keep]
+
+        # Keep the heaviest targets of every source, followers break ties
+        order = np.lexsort((-self.followers[targets], -weights, sources))
+        sources, targets, weights = sources[order], targets[order], weights[order]
+        starts = group_starts(sources)
+        ranks = np.arange(len(sources)) - np.repeat(starts, np.diff(np.r_[starts, len(sources)]))
+        keep = ranks < max_targets
+
+        return pd.DataFrame({"source": sources[keep], "target": targets[keep], "weight": weights[keep]})
+
+
+def prune_edges(edges, max_nodes):
+    # Take the heaviest edges first until the node budget is reached
+    edges = edges.sort_values("weight", ascending=False, kind="stable")
+    users = pd.unique(edges[["source", "target"]].to_numpy().ravel())[:max_nodes]
+    return edges[edges["source"].isin(users) & edges["target"].isin(users)]
@@ -0,0 +1,109 @@
+import argparse
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import config
+from cleaning import fill_cleaned
+from sentiment import fill_sentiment
+
+
+"""
+==================================================================================
+Dataset Ingest
+==================================================================================
+
+Convert the labeled csv into a columnar parquet file with the fixed schema from
+`config.DATA_SCHEMA`:
+- sentiment and screen names as categoricals
+- public metrics and followers count as int32
+- possibly_sensitive as bool
+- tweet and user ids as int64
+
+The csv is converted in chunks, every chunk is written as one parquet row group.
+Tweets without a cleaned text, or every tweet with `--clean-text`, are cleaned and
+tweets without a sentiment label, or every tweet with `--rescore-sentiment`, are
+labeled on the way.
+
+Usage:
+    python ingest.py [--csv src/csv/labeled.csv] [--out src/parquet/labeled.parquet]
+                     [--clean-text] [--rescore-sentiment]
+
+"""
+
+def parse_id(value):
+    try:
+        return int(value)
+    except ValueError:
+        return int(float(value))
+
+
+def apply_schema(chunk):
+    typed = pd.DataFrame({config.DATE_COL: pd.to_datetime(chunk[config.DATE_COL])})
+
+    for col, dtype in config.DATA_SCHEMA.items():
+        series = chunk[col]
+        if col in config.ID_COLS:
+            # Parse ids without passing through float
+            ids = [parse_id(value) if pd.notna(value) else None for value in series]
+            series = pd.Series(pd.array(ids, dtype=dtype), index=series.index)
+        elif dtype.startswith("int"):
+            series = series.fillna(0)
+        elif dtype == "bool":
+            series = series.fillna(False)
+        typed[col] = series.astype(dtype)
+
+    return typed
+
+
+def arrow_schema(typed):
+    # Use the same dictionary index type for every row group
+    schema = pa.Schema.from_pandas(typed, preserve_index=False)
+    for i, field in enumerate(schema):
+        if pa.types.is_dictionary(field.type):
+            schema = schema.set(i, field.with_type(pa.dictionary(pa.int32(), pa.string())))
+
+    return schema
+
+
+def ingest(csv_path=config.DATA_PATH, out_path=config.COLUMNAR_PATH, chunksize=config.ROW_GROUP_SIZE,
+           reclean=False, rescore=False):
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    tmp_path = f"{out_path}.tmp"
+
+    # The cleaned text and sentiment columns may be missing from raw dumps
+    columns = {config.DATE_COL, *config.DATA_SCHEMA}
+    chunks = pd.read_csv(
+        csv_path,
+        usecols=lambda col: col in columns,
+        dtype={col: str for col in config.ID_COLS},
+        chunksize=chunksize)
+
+    writer = None
+    try:
+        for chunk in chunks:
+            typed = apply_schema(fill_sentiment(fill_cleaned(chunk, reclean), rescore))
+            if writer is None:
+                schema = arrow_schema(typed)
+                writer = pq.ParquetWriter(tmp_path, schema)
+            writer.write_table(pa.Table.from_pandas(typed, schema=schema, preserve_index=False))
+    finally:
+        if writer is not None:
+            writer.close()
+
+    # Replace the old dataset only when the new one is complete
+    os.replace(tmp_path, out_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert the labeled csv into a columnar dataset")
+    parser.add_argument("--csv", default=config.DATA_PATH)
+    parser.add_argument("--out", default=config.COLUMNAR_PATH)
+    parser.add_argument("--chunksize", type=int, default=config.ROW_GROUP_SIZE)
+    parser.add_argument("--clean-text", action="store_true")
+    parser.add_argument("--rescore-sentiment", action="store_true")
+    args = parser.parse_args()
+
+    ingest(args.csv, args.out, args.chunksize, args.clean_text, args.rescore_sentiment)
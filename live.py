@@ -0,0 +1,290 @@
+import json
+import logging
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import config
+from cleaning import fill_cleaned
+from ingest import apply_schema
+from matcher import match_queries
+from ranges import date_bounds, date_slice
+from sentiment import fill_sentiment
+from stream import ROW_COL, QueryPartials
+
+
+"""
+==================================================================================
+Live Ingest
+==================================================================================
+
+Follow a live tweet feed next to the loaded dataset. `config.LIVE_FEED` is either the
+path of an append-only JSONL file or `tcp://host:port` of a socket sending JSONL, one
+tweet per line in the Twitter API layout (nested `user` objects are flattened to the
+`user.*` columns).
+
+A background thread reads new lines in micro-batches of `config.LIVE_BATCH_SIZE`.
+Every batch is parsed with the dataset schema and matched once per query, and the
+match columns are kept with the batch. The trends and counts of every open view, one
+(queries, period, date range) combination, are `QueryPartials` built once from the
+loaded dataset and then updated with each new batch, so a refresh costs the new
+tweets only instead of a reload of the dataset.
+
+Tweets without a cleaned text or a sentiment label are cleaned and labeled. Live tweets
+continue the row numbers of the dataset, user counts keep the first tweet of every
+user across both. Incomplete lines wait for the next read, lines that are not valid
+JSON and tweets whose fields do not fit the dataset schema are logged and skipped.
+Lines are only consumed once their batch parsed, a batch that fails for any other
+reason is logged and read again on the next poll.
+
+"""
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_ERRORS = (ValueError, TypeError, OverflowError)
+
+AGG_COLS = [
+    config.USER_ID_COL, config.USER_FOLLOWERS_COL, config.SENSITIVE_COL, config.SENTIMENT_COL
+] + config.METRIC_COLS
+
+
+class FileTail:
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.next_offset = 0
+
+    def read_lines(self, max_lines):
+        # Lines are read again until they are committed
+        try:
+            with open(self.path, "rb") as feed:
+                # Start over when the file was truncated or replaced
+                feed.seek(0, 2)
+                if feed.tell() < self.offset:
+                    self.offset = 0
+                feed.seek(self.offset)
+
+                lines = []
+                self.next_offset = self.offset
+                while len(lines) < max_lines:
+                    line = feed.readline()
+                    if not line.endswith(b"\n"):
+                        break
+                    lines.append(line)
+                    self.next_offset += len(line)
+                return lines
+        except FileNotFoundError:
+            return []
+
+    def commit(self):
+        self.offset = self.next_offset
+
+
+class SocketTail:
+
+    def __init__(self, address):
+        host, port = address.rsplit(":", 1)
+        self.address = (host, int(port))
+        self.connection = None
+        self.buffer = b""
+        self.pending = 0
+
+    def read_lines(self, max_lines):
+        try:
+            if self.connection is None:
+                self.connection = socket.create_connection(self.address, timeout=1)
+                self.connection.setblocking(False)
+
+            while self.buffer.count(b"\n") < max_lines:
+                data = self.connection.recv(1 << 16)
+                if not data:
+                    raise ConnectionError("live feed closed")
+                self.buffer += data
+        except BlockingIOError:
+            pass
+        except OSError:
+            # Reconnect on the next read
+            if self.connection is not None:
+                self.connection.close()
+            self.connection = None
+
+        # Lines stay in the buffer until they are committed
+        lines = self.buffer.split(b"\n")[:-1][:max_lines]
+        self.pending = sum(len(line) + 1 for line in lines)
+        return [line + b"\n" for line in lines]
+
+    def commit(self):
+        self.buffer = self.buffer[self.pending:]
+        self.pending = 0
+
+
+def open_tail(source):
+    if source.startswith("tcp://"):
+        return SocketTail(source[len("tcp://"):])
+    return FileTail(source)
+
+
+def type_tweets(records, tz=None):
+    # Flatten nested user objects into the user.* columns
+    tweets = pd.json_normalize(records)
+    for col in [config.DATE_COL] + list(config.DATA_SCHEMA):
+        if col not in tweets:
+            tweets[col] = None
+
+    tweets = apply_schema(fill_sentiment(fill_cleaned(tweets)))
+    dates = pd.to_datetime(tweets[config.DATE_COL], utc=True)
+    tweets[config.DATE_COL] = dates.dt.tz_convert(tz) if tz is not None else dates.dt.tz_convert(None)
+    return tweets
+
+
+def fits_schema(record, tz=None):
+    try:
+        type_tweets([record], tz)
+        return True
+    except SCHEMA_ERRORS:
+        logger.warning("Skipped a live tweet that does not fit the schema: %s", json.dumps(record)[:200])
+        return False
+
+
+def parse_tweets(lines, first_row=0, tz=None):
+    records = []
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(record, dict):
+            records.append(record)
+
+    # Type the batch at once, or find and skip the tweets that break it
+    try:
+        tweets = type_tweets(records, tz) if records else None
+    except SCHEMA_ERRORS:
+        records = [record for record in records if fits_schema(record, tz)]
+        tweets = type_tweets(records, tz) if records else None
+
+    if tweets is None:
+        return None
+
+    tweets[ROW_COL] = np.arange(first_row, first_row + len(tweets))
+    return tweets.set_index(config.DATE_COL).sort_index(kind="mergesort")
+
+
+def in_range(frame, date_range):
+    if date_range is None:
+        return frame
+
+    start, end = date_bounds(date_range, frame.index.tz)
+    return frame[(frame.index >= start) & (frame.index < end)]
+
+
+class LiveFeed:
+
+    def __init__(self, source, first_row=0, tz=None):
+        self.source = source
+        self.tail = open_tail(source)
+        self.tz = tz
+        self.next_row = first_row
+        self.batches = []
+        self.batch_matches = []
+        self.views = OrderedDict()
+        self.updated_at = None
+        self.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def rows(self):
+        return sum(len(batch) for batch in self.batches)
+
+    def matches(self, index, queries):
+        # Match every query once per batch
+        batch, known = self.batches[index], self.batch_matches[index]
+        missing = [query for query in queries if query not in known]
+        if missing:
+            new = match_queries(batch[config.TEXT_COL], missing)
+            known.update({query: new[query] for query in missing})
+
+        return pd.DataFrame({query: known[query] for query in queries}, index=batch.index)
+
+    def add_batch(self, index, key, partials):
+        queries, _, date_range = key
+        batch = self.batches[index]
+        matches = in_range(self.matches(index, queries), date_range)
+        if len(matches):
+            partials.add(in_range(batch, date_range), matches)
+
+    def poll(self):
+        with self.lock:
+            while True:
+                lines = self.tail.read_lines(config.LIVE_BATCH_SIZE)
+                batch = parse_tweets(lines, self.next_row, self.tz)
+
+                # A batch that fails to parse is read again on the next poll
+                self.tail.commit()
+                if batch is not None:
+                    self.next_row += len(batch)
+                    self.batches.append(batch)
+                    self.batch_matches.append({})
+                    self.updated_at = time.time()
+
+                    # Update every open view with the new tweets only
+                    for key, partials in self.views.items():
+                        self.add_batch(len(self.batches) - 1, key, partials)
+
+                if len(lines) < config.LIVE_BATCH_SIZE:
+                    break
+
+    def query_data(self, queries, df, matches, period="1D", date_range=None):
+        key = (tuple(queries), period, date_range)
+        with self.lock:
+            if key not in self.views:
+                partials = QueryPartials(list(queries), period)
+
+                # Start from the loaded dataset, then add the live batches so far
+                rows = date_slice(df, date_range)
+                if rows.stop > rows.start:
+                    base = df.iloc[rows][AGG_COLS].assign(**{ROW_COL: np.arange(rows.start, rows.stop)})
+                    partials.add(base, matches.iloc[rows])
+                for index in range(len(self.batches)):
+                    self.add_batch(index, key, partials)
+
+                self.views[key] = partials
+                while len(self.views) > config.LIVE_MAX_VIEWS:
+                    self.views.popitem(last=False)
+
+            self.views.move_to_end(key)
+            return self.views[key].result()
+
+    def run(self):
+        while True:
+            try:
+                self.poll()
+            except Exception:
+                # Keep following the feed, the failed batch is retried
+                logger.exception("Live feed poll failed: %s", self.source)
+            time.sleep(config.LIVE_POLL_SECONDS)
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="live-feed", daemon=True)
+            self.thread.start()
+        return self
+
+
+feeds = {}
+feeds_lock = threading.Lock()
+
+
+def live_feed(df):
+    # One feed per server process, shared by every session
+    with feeds_lock:
+        if config.LIVE_FEED not in feeds:
+            feed = LiveFeed(config.LIVE_FEED, first_row=len(df), tz=df.index.tz)
+            feed.poll()
+            feeds[config.LIVE_FEED] = feed.start()
+        return feeds[config.LIVE_FEED]
@@ -1,66 +1,356 @@
+from functools import lru_cache, partial
+
+import numpy as np
 import pandas as pd
 import streamlit as st
-import nltk
-from nltk.corpus import stopwords
-nltk.download("stopwords")
+from PIL import Image
 
 
 import config
-from metrics import tweet_trends, query_metric, all_counts, user_involvement
-from utils import color_generator
+from cache import cached, data_path, dataset_version
+from centrality import influence_scores
+from cleaning import fill_cleaned, load_stopword_set
+from cube import TweetCube
+from dedup import TextClusters, build_clusters
+from executor import map_queries
+from graph import ReplyGraph
+from live import live_feed
+from matcher import match_queries, normalize_query, query_mask
+from metrics import COUNT_ITEMS, all_counts, user_counts, user_involvement
+from ranking import TweetRanking
+from ranges import RangeSums, date_mask, date_slice, filter_date_range
+from sentiment import fill_sentiment
+from shared import load_shared
+from sketch import UserSketches
+from store import RESULT_STORE, store_version
+from telemetry import traced
+from stream import stream_dates, stream_query_data, stream_top_rows
+from terms import WORDCLOUD_TWEETS, TermMatrix, build_terms, query_rows
+from token_index import TokenIndex, build_index
+from utils import color_generator, render_wordcloud, replace_wspace
+
 
+def read_data():
+    # Read only the used columns of the columnar dataset
+    if data_path() == config.COLUMNAR_PATH:
+        df = pd.read_parquet(config.COLUMNAR_PATH, columns=[config.DATE_COL] + config.LOAD_COLS)
+        df = df.set_index(config.DATE_COL)
+    else:
+        df = pd.read_csv(config.DATA_PATH, parse_dates=[config.DATE_COL], index_col=config.DATE_COL)
 
-@st.cache
+    # Clean and label fresh tweets, sort by date so date ranges are contiguous slices
+    return fill_sentiment(fill_cleaned(df)).sort_index(kind="mergesort")
+
+@traced
+@cached
 def load_data():
-    return pd.read_csv(config.DATA_PATH, parse_dates=[config.DATE_COL], index_col=config.DATE_COL)
+    # Attach to the copy shared by every server process
+    if config.SHARED_DATASET:
+        return load_shared(dataset_version(), read_data)
+    return read_data()
+
+@traced
+@cached
+def load_index():
+    version = dataset_version()
+
+    # Reuse the index on disk while the dataset is unchanged
+    index = TokenIndex.load(config.INDEX_PATH)
+    if index is None or index.version != version:
+        index = build_index(load_data(), version=version)
+        index.save(config.INDEX_PATH)
+        index = TokenIndex.load(config.INDEX_PATH)
+
+    return index
+
+@traced
+@cached
+def load_clusters():
+    version = f"{dataset_version()}:{config.DEDUP_SIMILARITY}"
+
+    # Reuse the clusters on disk while the dataset and similarity are unchanged
+    clusters = TextClusters.load(config.INDEX_PATH)
+    if clusters is None or clusters.version != version:
+        clusters = build_clusters(load_data(), version=version)
+        clusters.save(config.INDEX_PATH)
+
+    return clusters
+
+@traced
+@cached
+def load_terms():
+    clusters = load_clusters()
+
+    # Reuse the term frequencies on disk while the clusters are unchanged
+    terms = TermMatrix.load(config.INDEX_PATH)
+    if terms is None or terms.version != clusters.version:
+        terms = build_terms(load_data().iloc[clusters.representatives], load_stopword_set(), version=clusters.version)
+        terms.save(config.INDEX_PATH)
+
+    return terms
+
+@traced
+@cached
+def load_match_data(queries, df):
+    return match_queries(df[config.TEXT_COL], queries, load_index())
+
+@traced
+@cached
+def load_cube():
+    # Catch up with rows appended since the cube was saved
+    cube = TweetCube.load()
+    if cube is None or not cube.append():
+        cube = TweetCube.empty(load_data())
+
+    cube.save()
+    return cube
 
-@st.cache
-def load_trends_data(queries, df):
-    return tweet_trends("1D", queries, df)
+@traced
+def load_cube_data(queries, df):
+    cube = load_cube()
+
+    # Aggregate new queries from the raw DataFrame
+    if cube.add_missing(df, queries, load_match_data):
+        cube.save()
+
+    return cube
+
+@traced
+def load_query_pieces(kind, queries, df, compute):
+    version = store_version(dataset_version())
+    keys = [normalize_query(query) for query in queries]
+
+    # Compute only the queries that are not stored yet
+    pieces = RESULT_STORE.get_many(version, kind, set(keys))
+    missing = [query for query, key in zip(queries, keys) if key not in pieces]
+    if missing:
+        computed = dict(zip([normalize_query(query) for query in missing], compute(missing, df)))
+        RESULT_STORE.put_many(version, kind, computed)
+        pieces.update(computed)
+
+    return [pieces[key] for key in keys]
+
+def trends_pieces(queries, df, period):
+    trends = load_cube_data(queries, df).trends(period, queries)
+    return [trends[replace_wspace(query)].rename(None) for query in queries]
+
+@traced
+@cached
+def load_trends_data(queries, df, period="1D", date_range=None):
+    if config.STREAMING:
+        return load_stream_data(queries, period, date_range)[1]
+
+    pieces = load_query_pieces(f"trends:{period}", queries, df, partial(trends_pieces, period=period))
+
+    # Assemble the trends of every query
+    trends = pd.concat(pieces, axis=1).fillna(0).astype(np.int64)
+    trends.columns = [replace_wspace(query) for query in queries]
+    trends = filter_date_range(trends, date_range)
+    trends["date"] = trends.index
+
+    return trends
+
+def metric_pieces(queries, df):
+    # Match queries once for all metrics
+    matches = load_match_data(queries, df)
 
-@st.cache(allow_output_mutation=True)
-def load_metric_data(queries, df):
     # Get metrics DataFrame
-    metrics_df = query_metric(queries, df)
+    metrics_df = load_cube_data(queries, df).metrics(queries)
 
     # Get counts DataFrame
-    counts_df = all_counts(df, queries)
+    counts_df = all_counts(df, queries, matches)
 
     # Concat both metrics and counts
     metric_count_df = pd.concat([metrics_df, counts_df], axis=1)
 
+    return [row for _, row in metric_count_df.iterrows()]
+
+@traced
+@cached
+def load_range_sums(queries, df):
+    return RangeSums.build(df, queries, load_match_data(queries, df))
+
+@traced
+@cached
+def load_user_sketches(queries, df):
+    return UserSketches.build(df, queries, load_match_data(queries, df))
+
+def range_metric_data(queries, df, date_range):
+    # Get tweet level totals from the prefix sums
+    totals = load_range_sums(queries, df).totals(date_range)
+
+    # Get user counts from the rows in range, or estimate them from the sketches
+    if config.USER_SKETCHES:
+        users = load_user_sketches(queries, df).counts(date_range)
+    else:
+        matches = load_match_data(queries, df)
+        rows = date_slice(df, date_range)
+        users = user_counts(df.iloc[rows], queries, matches.iloc[rows])
+
+    metric_count_df = pd.concat([totals, users], axis=1)
+    return metric_count_df[config.METRIC_COLS + list(COUNT_ITEMS)]
+
+@traced
+@cached
+def load_metric_data(queries, df, date_range=None):
+    # Assemble the metrics and counts of every query
+    if config.STREAMING:
+        metric_count_df = load_stream_data(queries, "1D", date_range)[0].copy()
+    elif date_range is None:
+        pieces = load_query_pieces("metrics", queries, df, metric_pieces)
+        metric_count_df = pd.DataFrame(pieces, index=queries)
+    else:
+        metric_count_df = range_metric_data(queries, df, date_range)
+
     # Create user involvement DataFrame
     user_df = user_involvement(metric_count_df)
 
     # Return last concatenated DataFrame
     return user_df
 
-@st.cache(allow_output_mutation=True)
+def wordcloud_pieces(queries, df, date_range=None):
+    terms, clusters = load_terms(), load_clusters()
+    matches = load_match_data(queries, df)
+
+    # Sum the term frequencies of the clusters of the selected tweets in date range
+    in_range = date_mask(df, date_range)
+    filters = [query_mask(matches, query) & in_range for query in queries]
+    rows_list = map_queries(query_rows, filters, df=df)
+    return [terms.frequencies(*clusters.collapse(rows)) for rows in rows_list]
+
+def stream_wordcloud_pieces(queries, date_range=None):
+    stopwords = load_stopword_set()
+    rows_list = load_stream_top_rows(queries, WORDCLOUD_TWEETS, True, date_range)
+    return [build_terms(rows, stopwords).frequencies(np.arange(len(rows))) for rows in rows_list]
+
+@traced
+@cached
+def load_wordcloud_data(queries, df, date_range=None):
+    if config.STREAMING:
+        return stream_wordcloud_pieces(queries, date_range)
+    if date_range is None:
+        return load_query_pieces("wordcloud:terms", queries, df, wordcloud_pieces)
+    return wordcloud_pieces(queries, df, date_range)
+
+def wordcloud_image_pieces(queries, df, date_range=None):
+    frequencies_list = load_wordcloud_data(queries, df, date_range)
+    return map_queries(render_wordcloud, frequencies_list, kind=config.CPU_EXECUTOR, mask=load_wordcloud_mask())
+
+@traced
+@cached
+def load_wordcloud_images(queries, df, date_range=None):
+    if date_range is None:
+        return load_query_pieces("wordcloud_png", queries, df, wordcloud_image_pieces)
+    return wordcloud_image_pieces(queries, df, date_range)
+
+@traced
+@cached
+def load_wordcloud_mask():
+    return np.array(Image.open(config.WORDCLOUD_MASK_PATH))
+
+@traced
+@cached
+def load_graph(df):
+    return ReplyGraph.build(df)
+
+def relation_pieces(queries, df, date_range=None):
+    graph = load_graph(df)
+    matches = load_match_data(queries, df)
+
+    # Extract the reply subgraph of every query in date range
+    in_range = date_mask(df, date_range)
+    filters = [query_mask(matches, query) & in_range for query in queries]
+    return map_queries(graph.subgraph, filters)
+
+@traced
+@cached
+def load_relations_data(queries, df, date_range=None):
+    if date_range is None:
+        return load_query_pieces("relations", queries, df, relation_pieces)
+    return relation_pieces(queries, df, date_range)
+
+def influence_pieces(queries, df, date_range=None):
+    graph = load_graph(df)
+    matches = load_match_data(queries, df)
+
+    # Rank the users of every query subgraph in date range
+    in_range = date_mask(df, date_range)
+    filters = [query_mask(matches, query) & in_range for query in queries]
+    return map_queries(partial(influence_scores, graph), filters)
+
+@traced
+@cached
+def load_influence_data(queries, df, date_range=None):
+    if date_range is None:
+        return load_query_pieces("influence", queries, df, influence_pieces)
+    return influence_pieces(queries, df, date_range)
+
+@traced
+@cached
+def load_tweet_rankings(queries, df, date_range=None):
+    matches = load_match_data(queries, df)
+    in_range = date_mask(df, date_range)
+    replies = df[config.REPLY_COL].fillna(0).to_numpy()
+
+    # Rank the tweets of every query in date range by replies
+    rankings = []
+    for query in queries:
+        positions = np.flatnonzero(query_mask(matches, query) & in_range)
+        rankings.append(TweetRanking(positions, replies[positions]))
+
+    return rankings
+
+@traced
+def load_tweet_pages(queries, df, page, date_range=None):
+    size = config.TWEETS_PER_PAGE
+    if config.STREAMING:
+        return [rows[page * size:] for rows in load_stream_top_rows(queries, (page + 1) * size, False, date_range)]
+
+    rankings = load_tweet_rankings(queries, df, date_range)
+    return [df.iloc[ranking.page(page, size)] for ranking in rankings]
+
+@traced
+@cached
+def load_stream_data(queries, period="1D", date_range=None):
+    return stream_query_data(queries, period, date_range)
+
+@traced
+@cached
+def load_stream_top_rows(queries, k, ascending=False, date_range=None):
+    return stream_top_rows(queries, k, ascending, date_range)
+
+@traced
+def load_live_data(queries, df, period="1D", date_range=None):
+    # Dataset and live tweets so far, never cached
+    metric_df, trends_df = live_feed(df).query_data(queries, df, load_match_data(queries, df), period, date_range)
+    return user_involvement(metric_df), trends_df
+
+@traced
+@cached
+def load_date_bounds(df):
+    if config.STREAMING:
+        return stream_dates()
+    return df.index.min(), df.index.max()
+
+@traced
 def load_transformed_charts_data(df):
     len_data = df.shape[0]
     color_gen = color_generator()
 
-    # Transform data
+    # Transform a copy, charts add their own columns and must not change the session data
+    df = df.copy()
     df[config.CATEGORY_COL] = df.index
     df[config.COLOR_COL] = [next(color_gen) for i in range(len_data)]
 
     return df
 
-@st.cache(allow_output_mutation=True)
-def load_network_data(df):
-    relations = df.groupby("in_reply_to_status_id_str").agg({"id_str": list})
-    relations = relations.head(100).explode("id_str")
-
-
-@st.cache
+@traced
+@lru_cache(maxsize=None)
 def load_tweet_template():
     with open(config.TWEET_TEMPLATE_PATH, "r") as template:
         return template.read()
 
+@traced
 def load_tweet_style():
     with open(config.TWEET_STYLE_PATH, "r") as style:
         st.markdown(style.read(), unsafe_allow_html=True)
-
-@st.cache
-def load_stopwords():
-    return stopwords.words("indonesian")
\ No newline at end of file
@@ -1,9 +1,10 @@
 import streamlit as st
 from loader import load_tweet_style
 from styles import set_style
+from telemetry import span
 from views import (
     show_home, show_trend, show_public_analysis, show_tweet_details, show_wordcloud,
-    show_network
+    show_network, show_date_range, show_live_status, show_debug_panel
     )
 
 # Initial Load
@@ -26,4 +27,9 @@ def change_page(page):
     run()
 
 page = st.sidebar.selectbox("", PAGES.keys())
-change_page(page)
\ No newline at end of file
+with span(f"page.{page}"):
+    show_date_range()
+    change_page(page)
+
+show_live_status()
+show_debug_panel()
@@ -0,0 +1,117 @@
+import re
+from functools import partial
+
+import ahocorasick
+import numpy as np
+import pandas as pd
+
+from executor import map_queries
+from query_language import canonical_query, evaluate_mask, is_tag, parse_query, query_terms
+
+
+"""
+==================================================================================
+Query Matcher
+==================================================================================
+
+Match all queries against the tweet text in a single pass. Queries are compiled
+into one Aho-Corasick automaton, so every tweet is scanned once no matter how many
+queries are searched. The result is a boolean rows-by-queries DataFrame that every
+metric and view reuses instead of running `str.contains` per query.
+
+Queries are boolean expressions of terms, see `query_language`. The distinct terms
+of all queries are matched together and every query is evaluated from their rows.
+Matching a term is a case insensitive substring match, same as the previous
+`str.contains(query, flags=re.IGNORECASE)` for plain keywords. When a token index
+is given, the candidate rows of the terms it can answer are looked up from the index
+and verified, with the same substring semantics as a scan. The remaining terms are
+scanned. Hashtag and mention terms are verified to end at a word boundary.
+
+"""
+
+def normalize_query(query):
+    return canonical_query(parse_query(query))
+
+
+def split_queries(text):
+    # Split on commas outside quoted phrases
+    queries, quoted, start = [], False, 0
+    for pos, char in enumerate(text):
+        if char == '"':
+            quoted = not quoted
+        elif char == "," and not quoted:
+            queries.append(text[start:pos].strip())
+            start = pos + 1
+
+    return queries + [text[start:].strip()]
+
+
+def build_automaton(terms):
+    # Group columns by pattern, so identical patterns are matched once
+    columns = {}
+    for col, term in enumerate(terms):
+        columns.setdefault(term, []).append(col)
+
+    automaton = ahocorasick.Automaton()
+    for pattern, cols in columns.items():
+        automaton.add_word(pattern, cols)
+    automaton.make_automaton()
+
+    return automaton
+
+
+def match_terms(texts, terms, index=None):
+    matches = np.zeros((len(texts), len(terms)), dtype=bool)
+
+    # Look up terms from the index in parallel
+    if index is not None:
+        searches = map_queries(partial(index.search, texts), terms)
+    else:
+        searches = [None] * len(terms)
+
+    scan_cols = []
+    for col, rows in enumerate(searches):
+        if rows is None:
+            scan_cols.append(col)
+        else:
+            matches[rows, col] = True
+
+    # Scan the text for the rest of the terms
+    if len(scan_cols) > 0:
+        automaton = build_automaton([terms[col] for col in scan_cols])
+
+        # Scan every distinct text once, retweets and copies share their matches
+        codes, unique_texts = pd.factorize(texts.fillna("").str.lower())
+        unique_matches = np.zeros((len(unique_texts), len(scan_cols)), dtype=bool)
+        for row, text in enumerate(unique_texts):
+            for _, cols in automaton.iter(text):
+                unique_matches[row, cols] = True
+        matches[:, scan_cols] = unique_matches[codes]
+
+    # Whole hashtags and mentions only, checked on the candidate rows
+    for col, term in enumerate(terms):
+        if is_tag(term):
+            rows = np.flatnonzero(matches[:, col])
+            pattern = re.escape(term) + r"(?!\w)"
+            matches[rows, col] = texts.iloc[rows].str.contains(pattern, case=False).to_numpy(dtype=bool)
+
+    return matches
+
+
+def match_queries(texts, queries, index=None):
+    expressions = [parse_query(query) for query in queries]
+
+    # Match every distinct term once for all queries
+    terms = list(dict.fromkeys(term for expression in expressions for term in query_terms(expression)))
+    term_matches = match_terms(texts, terms, index)
+    term_masks = {term: term_matches[:, col] for col, term in enumerate(terms)}
+
+    matches = np.zeros((len(texts), len(queries)), dtype=bool)
+    for col, expression in enumerate(expressions):
+        matches[:, col] = evaluate_mask(expression, term_masks, len(texts))
+
+    return pd.DataFrame(matches, index=texts.index, columns=queries)
+
+
+def query_mask(matches, query):
+    return matches[query].to_numpy()
@@ -1,12 +1,10 @@
-import re
-from collections import defaultdict
-from functools import partial
-
 import numpy as np
 import pandas as pd
 
 import config
-from utils import filter_tweet_count, replace_wspace
+from matcher import match_queries, query_mask
+from telemetry import traced
+from utils import replace_wspace
 
 
 """
@@ -14,25 +12,26 @@ from utils import filter_tweet_count, replace_wspace
 Tweet Timeline
 ==================================================================================
 
-Get daily tweet count based on specific query
+Get periodic tweet count based on specific query. All queries are counted together
+with a single time bucket groupby over the query-match matrix, period can be any
+pandas frequency such as `1H`, `1D` or `1W`.
 
 """
 
 
-def tweet_trends(period, queries, df):
+@traced
+def tweet_trends(period, queries, df, matches=None):
 
-    # Copy Dataframe
-    df = df.copy()
+    # Match queries
+    if matches is None:
+        matches = match_queries(df[config.TEXT_COL], queries)
 
     # Count tweets based on its query periodically
-    trends = pd.concat([
-        df.resample(period).agg({config.TEXT_COL: partial(filter_tweet_count, query=query)})
-        for query in queries
-    ], axis=1)
+    trends = matches[queries].groupby(pd.Grouper(freq=period)).sum().astype(np.int64)
 
     # Change column names and index
     trends.columns = [replace_wspace(query) for query in queries]
-    trends["date"] = [date for date in trends.index]
+    trends["date"] = trends.index
 
     return trends
 
@@ -50,11 +49,17 @@ Public Metrics is provided by twitter API, it is consist of:
 
 """
 
-def query_metric(queries, df):
+@traced
+def query_metric(queries, df, matches=None):
+
+    # Match queries
+    if matches is None:
+        matches = match_queries(df[config.TEXT_COL], queries)
+
     analytics = {}
     for query in queries:
-        filter = df[config.TEXT_COL].str.contains(query, flags=re.IGNORECASE)
-        analytics[query] = df[filter][config.METRIC_COLS].sum(axis=0)
+        filter = query_mask(matches, query)
+        analytics[query] = df.loc[filter, config.METRIC_COLS].sum(axis=0)
 
     return pd.DataFrame(analytics).T
 
@@ -72,6 +77,9 @@ Count specifics aspect from all the tweets on every query:
 - Viral Count
   Viral Tweets is determined by any tweets that has more than 1000 `reply`, `like` or `retweet`
 
+- Users Count
+  Users Count is the number of unique users who tweeted on the query.
+
 - User Followers Count
   User Followers Count is determined by the total followers of unique users.
 
@@ -81,30 +89,37 @@ Count specifics aspect from all the tweets on every query:
 - Sensitive Count
   Sensitive Count is the total of potential harmfull tweet that marked as sensitive by twitter
 
+Every count item returns one value per row, the counts of all queries are then
+computed together as a product of the query-match matrix and the item values.
+Items in `USER_COUNT_ITEMS` receive the unique users of each query instead of the
+tweets, users are deduplicated once for all queries. New items are registered by
+adding them to `COUNT_ITEMS`.
+
 """
 
 def count_tweet(df):
-    return len(df)
+    return np.ones(len(df))
 
 def count_viral(df):
-    return (df[config.METRIC_COLS] > 1000).any(axis=1).sum()
+    return (df[config.METRIC_COLS] > 1000).any(axis=1)
 
 def count_sensitive(df):
-    return df[config.SENSITIVE_COL].sum()
+    return df[config.SENSITIVE_COL].fillna(0).astype(np.int64)
 
-def count_followers(df):
-    unique_user = df[[config.USER_ID_COL, config.USER_FOLLOWERS_COL]].drop_duplicates(subset=[config.USER_ID_COL])
-    return unique_user[config.USER_FOLLOWERS_COL].sum()
+def count_unique_users(users):
+    return np.ones(len(users))
 
-def count_influencer(df):
-    unique_user = df[[config.USER_ID_COL, config.USER_FOLLOWERS_COL]].drop_duplicates(subset=[config.USER_ID_COL])
-    return (unique_user[config.USER_FOLLOWERS_COL] > 1000).sum()
+def count_followers(users):
+    return users[config.USER_FOLLOWERS_COL].fillna(0)
+
+def count_influencer(users):
+    return users[config.USER_FOLLOWERS_COL] > 1000
 
 def count_pos_sentiment(df):
-    return (df[config.SENTIMENT_COL] == "positive").sum()
+    return df[config.SENTIMENT_COL] == "positive"
 
 def count_neg_sentiment(df):
-    return (df[config.SENTIMENT_COL] == "negative").sum()
+    return df[config.SENTIMENT_COL] == "negative"
 
 
 
@@ -112,6 +127,7 @@ def count_neg_sentiment(df):
 COUNT_ITEMS = {
     "tweets_count": count_tweet,
     "viral_count": count_viral,
+    "users_count": count_unique_users,
     "followers_count": count_followers,
     "influencer_count": count_influencer,
     "sensitive_count": count_sensitive,
@@ -119,26 +135,58 @@ COUNT_ITEMS = {
     "negative_sentiment_count": count_neg_sentiment,
 }
 
+USER_COUNT_ITEMS = {"users_count", "followers_count", "influencer_count"}
 
-def all_counts(df, queries):
 
-    # Copy Dataframe
-    df = df.copy()
+@traced
+def unique_users(df, matches):
+    # One row for every unique (query, user) pair, first tweet of the user is kept
+    rows, cols = np.nonzero(matches)
+    users = df[[config.USER_ID_COL, config.USER_FOLLOWERS_COL]].iloc[rows]
+    users = users.assign(query=cols).drop_duplicates(subset=["query", config.USER_ID_COL])
 
-    # Initialize Dictionary
-    analytics = defaultdict(list)
+    return users
 
-    for query in queries:
-        # Filter tweet by query
-        filter = df[config.TEXT_COL].str.contains(query, flags=re.IGNORECASE)
-        filtered_df = df[filter]
 
-        # Counts all the aspects
-        for name, func in COUNT_ITEMS.items():
-            analytics[query].append( func(filtered_df) )
+def tweet_count_values(df):
+    names = [name for name in COUNT_ITEMS if name not in USER_COUNT_ITEMS]
+    values = np.column_stack([np.asarray(COUNT_ITEMS[name](df), dtype=np.float64) for name in names])
+    return pd.DataFrame(values, index=df.index, columns=names)
+
+
+def tweet_counts(df, queries, matches):
+    # Count tweet items of all queries at once
+    values = tweet_count_values(df)
+    counts = matches[queries].to_numpy().T.astype(np.float64) @ values.to_numpy()
+    return pd.DataFrame(counts, index=queries, columns=values.columns)
+
+
+def count_users(users, queries):
+    names = [name for name in COUNT_ITEMS if name in USER_COUNT_ITEMS]
+
+    # Count user items over the unique users of every query
+    values = pd.DataFrame({name: np.asarray(COUNT_ITEMS[name](users), dtype=np.float64) for name in names})
+    values = values.groupby(users["query"].to_numpy()).sum().reindex(range(len(queries)), fill_value=0)
+
+    return pd.DataFrame(values.to_numpy(), index=queries, columns=names)
+
+
+@traced
+def user_counts(df, queries, matches):
+    return count_users(unique_users(df, matches[queries].to_numpy()), queries)
+
+
+@traced
+def all_counts(df, queries, matches=None):
+
+    # Match queries
+    if matches is None:
+        matches = match_queries(df[config.TEXT_COL], queries)
+
+    # Concat both tweet and user counts
+    counts = pd.concat([tweet_counts(df, queries, matches), user_counts(df, queries, matches)], axis=1)
 
-    df_values = np.array(list(analytics.values()))
-    return pd.DataFrame(df_values, columns=COUNT_ITEMS.keys(), index=analytics.keys())
+    return counts[list(COUNT_ITEMS)].round().astype(np.int64)
 
 
 """
@@ -156,6 +204,7 @@ Make new variables from the existing counts, user Involvement made variables are
 
 """
 
+@traced
 def user_involvement(metrics_df):
     metrics_df["interactions"] = metrics_df[config.REPLY_COL] + metrics_df[config.QUOTE_COL]
     metrics_df["potential_users_reached"] = metrics_df[config.RETWEET_COL] + metrics_df[config.LIKE_COL]
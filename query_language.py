@@ -0,0 +1,170 @@
+import re
+
+import numpy as np
+
+
+"""
+==================================================================================
+Query Language
+==================================================================================
+
+Search queries are small boolean expressions:
+
+- terms        : `anies baswedan`, adjacent words form one phrase
+- phrases      : `"anies baswedan"`, may contain operators and parentheses
+- tags         : `#pemilu` and `@user`, match the whole hashtag or mention only
+- operators    : `NOT`, `AND` and `OR` in upper case, by precedence, terms next to
+                 each other without an operator are joined with AND
+- parentheses  : `(anies OR ganjar) AND NOT "harga minyak"`
+
+Terms are case insensitive substrings, a plain query with a single term matches
+the same tweets as before. Every distinct term is matched once over the text for all
+queries, each query is then evaluated on the packed row bitmaps of its terms, so
+combining terms costs a few bitwise operations instead of another pass over the text.
+
+Expressions are parsed into nested tuples, `("term", text)`, `("not", node)`,
+`("and", left, right)` and `("or", left, right)`. Invalid queries raise ValueError.
+
+"""
+
+TOKEN_PATTERN = re.compile(r'\s*(?:(\()|(\))|"([^"]*)("?)|([^\s()"]+))')
+OPERATORS = {"AND", "OR", "NOT"}
+TAG_PREFIXES = ("#", "@")
+
+
+def tokenize(query):
+    tokens, words = [], []
+    for match in TOKEN_PATTERN.finditer(query):
+        open_paren, close_paren, phrase, closed, word = match.groups()
+        if word and word not in OPERATORS:
+            words.append(word)
+            continue
+
+        # Adjacent words form one phrase
+        if words:
+            tokens.append(("term", " ".join(words)))
+            words = []
+
+        if phrase is not None:
+            if not closed:
+                raise ValueError(f"Tanda kutip tidak ditutup: {query}")
+            tokens.append(("term", phrase))
+        elif word:
+            tokens.append(("op", word))
+        else:
+            tokens.append(("paren", open_paren or close_paren))
+
+    if words:
+        tokens.append(("term", " ".join(words)))
+    return tokens
+
+
+class Parser:
+
+    def __init__(self, query):
+        self.query = query
+        self.tokens = tokenize(query)
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def error(self, message):
+        return ValueError(f"{message}: {self.query}")
+
+    def parse(self):
+        if not self.tokens:
+            raise self.error("Kata kunci kosong")
+
+        node = self.parse_or()
+        if self.pos < len(self.tokens):
+            raise self.error("Kurung tutup tanpa kurung buka")
+        return node
+
+    def parse_or(self):
+        node = self.parse_and()
+        while self.peek() == ("op", "OR"):
+            self.take()
+            node = ("or", node, self.parse_and())
+        return node
+
+    def parse_and(self):
+        node = self.parse_not()
+        while True:
+            kind, value = self.peek()
+            if (kind, value) == ("op", "AND"):
+                self.take()
+            elif not (kind == "term" or (kind, value) in [("op", "NOT"), ("paren", "(")]):
+                return node
+            node = ("and", node, self.parse_not())
+
+    def parse_not(self):
+        if self.peek() == ("op", "NOT"):
+            self.take()
+            return ("not", self.parse_not())
+        return self.parse_atom()
+
+    def parse_atom(self):
+        kind, value = self.take()
+        if kind == "term":
+            term = " ".join(value.lower().split())
+            if not term:
+                raise self.error("Frasa kosong")
+            return ("term", term)
+
+        if (kind, value) == ("paren", "("):
+            node = self.parse_or()
+            if self.take() != ("paren", ")"):
+                raise self.error("Kurung buka tanpa kurung tutup")
+            return node
+
+        raise self.error("Operator tanpa kata kunci")
+
+
+def parse_query(query):
+    return Parser(query).parse()
+
+
+def query_terms(node):
+    if node[0] == "term":
+        return [node[1]]
+    return [term for child in node[1:] for term in query_terms(child)]
+
+
+def canonical_query(node, top=True):
+    # A single term keeps its plain text, so plain queries keep their keys
+    if node[0] == "term":
+        return node[1] if top and not re.search(r'[()"]', node[1]) else f'"{node[1]}"'
+    if node[0] == "not":
+        return f"NOT {canonical_query(node[1], False)}"
+
+    text = f" {node[0].upper()} ".join(canonical_query(child, False) for child in node[1:])
+    return text if top else f"({text})"
+
+
+def is_tag(term):
+    return term.startswith(TAG_PREFIXES) and len(term.split()) == 1
+
+
+def evaluate(node, bitmaps):
+    # Bitmaps are row masks packed 8 rows per byte
+    if node[0] == "term":
+        return bitmaps[node[1]]
+    if node[0] == "not":
+        return ~evaluate(node[1], bitmaps)
+    if node[0] == "and":
+        return evaluate(node[1], bitmaps) & evaluate(node[2], bitmaps)
+    return evaluate(node[1], bitmaps) | evaluate(node[2], bitmaps)
+
+
+def evaluate_mask(node, term_masks, n_rows):
+    if node[0] == "term":
+        return term_masks[node[1]]
+
+    bitmaps = {term: np.packbits(term_masks[term]) for term in set(query_terms(node))}
+    return np.unpackbits(evaluate(node, bitmaps), count=n_rows).astype(bool)
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+import config
+from metrics import tweet_count_values
+
+
+"""
+==================================================================================
+Date Range
+==================================================================================
+
+Restrict the analysis to a date range without copying the dataset. The dataset is
+sorted by date, so the rows of a range are a contiguous slice found with a binary
+search on the DatetimeIndex.
+
+Range totals of the public metrics and the tweet level counts are read from per-query
+prefix sums over hourly buckets, so a range aggregate is two binary searches and a
+subtraction instead of a scan over the tweets.
+
+"""
+
+RANGE_BUCKET = "1H"
+
+
+def date_bounds(date_range, tz=None):
+    # The end date is inclusive
+    start, end = date_range
+    return pd.Timestamp(start, tz=tz), pd.Timestamp(end, tz=tz) + pd.Timedelta(days=1)
+
+
+def date_slice(df, date_range):
+    if date_range is None:
+        return slice(0, len(df))
+
+    start, end = date_bounds(date_range, df.index.tz)
+    return slice(df.index.searchsorted(start), df.index.searchsorted(end))
+
+
+def date_mask(df, date_range):
+    mask = np.zeros(len(df), dtype=bool)
+    mask[date_slice(df, date_range)] = True
+    return mask
+
+
+def filter_date_range(trends, date_range):
+    if date_range is None:
+        return trends
+
+    start, end = date_bounds(date_range, trends.index.tz)
+    return trends[(trends.index >= start) & (trends.index < end)]
+
+
+class RangeSums:
+
+    def __init__(self, buckets, sums, queries, columns, tz=None):
+        self.buckets = buckets
+        self.sums = sums
+        self.queries = queries
+        self.columns = columns
+        self.tz = tz
+
+    def __sizeof__(self):
+        return self.buckets.nbytes + self.sums.nbytes
+
+    @classmethod
+    def build(cls, df, queries, matches):
+        values = pd.concat([df[config.METRIC_COLS].fillna(0).astype(np.float64), tweet_count_values(df)], axis=1)
+        rows, cols = np.nonzero(matches[queries].to_numpy())
+
+        # Sum the values of every (bucket, query) pair
+        hours = df.index.floor(RANGE_BUCKET).to_numpy()
+        buckets = np.unique(hours)
+        cells = np.zeros((len(buckets) + 1, len(queries), values.shape[1]))
+        np.add.at(cells, (np.searchsorted(buckets, hours[rows]) + 1, cols), values.to_numpy()[rows])
+
+        return cls(buckets, np.cumsum(cells, axis=0), list(queries), list(values.columns), df.index.tz)
+
+    def totals(self, date_range):
+        start, end = date_bounds(date_range, self.tz)
+        lo = np.searchsorted(self.buckets, start.to_datetime64())
+        hi = np.searchsorted(self.buckets, end.to_datetime64())
+
+        totals = self.sums[hi] - self.sums[lo]
+        return pd.DataFrame(totals.round().astype(np.int64), index=self.queries, columns=self.columns)
@@ -0,0 +1,47 @@
+import threading
+
+import numpy as np
+
+
+"""
+==================================================================================
+Tweet Ranking
+==================================================================================
+
+Rank the tweets of a query by a value, e.g. the reply count, without sorting every
+matching tweet. A page of the ranking is served from a sorted prefix that is grown
+with `np.argpartition` only when a deeper page is requested, so the first pages cost
+a partial selection and later pages reuse the prefix.
+
+Ties are broken by row position, so pages never overlap or skip a tweet.
+
+"""
+
+
+class TweetRanking:
+
+    def __init__(self, positions, values):
+        # Higher value first, earlier row first on ties
+        self.positions = positions
+        self.keys = values.astype(np.int64) * (int(positions.max()) + 1 if len(positions) else 1) - positions
+        self.prefix = np.array([], dtype=np.int64)
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __sizeof__(self):
+        return self.positions.nbytes + self.keys.nbytes + self.prefix.nbytes
+
+    def top(self, k):
+        k = min(k, len(self))
+        with self.lock:
+            if len(self.prefix) < k:
+                # Grow the prefix at least twice to keep deeper pages cheap
+                size = min(max(k, 2 * len(self.prefix)), len(self))
+                top = np.argpartition(-self.keys, size - 1)[:size] if size < len(self) else np.arange(size)
+                self.prefix = top[np.argsort(-self.keys[top], kind="stable")]
+            return self.positions[self.prefix[:k]]
+
+    def page(self, number, size):
+        return self.top((number + 1) * size)[number * size:]
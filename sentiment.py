@@ -0,0 +1,108 @@
+import threading
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+import config
+from cleaning import NEGATIONS, split_words
+from executor import map_queries
+
+
+"""
+==================================================================================
+Sentiment Scoring
+==================================================================================
+
+Label tweets without an external labeling step. The score of a tweet is the sum of
+the lexicon scores of its words in `full_text_cleaned`, a word right after a negation
+(tidak, bukan, belum, ...) counts with the opposite sign. Scores from
+`SENTIMENT_THRESHOLD` up are positive, down from minus the threshold are negative and
+the rest are neutral. The lexicon is a local word and score table at
+`config.SENTIMENT_LEXICON_PATH`, no network is needed.
+
+Texts are scored in batches of `SCORE_BATCH`, a batch is split into words with one
+string split and the words are scored through their vocabulary codes. The batches
+run on the process pool. Labels are memoized by the hash of the text, so retweets
+and copies of a text are scored once per scorer.
+
+"""
+
+SENTIMENT_THRESHOLD = 1
+SCORE_BATCH = 50_000
+MEMO_MAX_ITEMS = 5_000_000
+LABELS = np.array(["negative", "neutral", "positive"], dtype=object)
+
+
+@lru_cache(maxsize=None)
+def load_lexicon(path=config.SENTIMENT_LEXICON_PATH):
+    lexicon = pd.read_csv(path, sep="\t", keep_default_na=False)
+    return dict(zip(lexicon["word"], lexicon["score"].astype(np.float64)))
+
+
+def score_texts(texts):
+    lexicon = load_lexicon()
+
+    codes, vocab, positions = split_words(text.lower() if isinstance(text, str) else "" for text in texts)
+    vocab_scores = np.array([lexicon.get(word, 0.0) for word in vocab])
+    vocab_negations = np.array([word in NEGATIONS for word in vocab], dtype=bool)
+
+    # Flip the score of a word after a negation in the same text
+    scores = vocab_scores[codes]
+    negated = np.zeros(len(codes), dtype=bool)
+    negated[1:] = vocab_negations[codes[:-1]] & (positions[1:] == positions[:-1])
+    scores = np.where(negated, -scores, scores)
+
+    return np.bincount(positions, weights=scores, minlength=len(texts))
+
+
+def label_texts(texts):
+    scores = score_texts(texts)
+    return LABELS[np.sign(np.trunc(scores / SENTIMENT_THRESHOLD)).astype(np.int64) + 1]
+
+
+class SentimentScorer:
+
+    def __init__(self):
+        self.memo = {}
+        self.lock = threading.Lock()
+
+    def score(self, texts):
+        texts = texts.fillna("")
+        hashes = pd.util.hash_pandas_object(texts, index=False).to_numpy()
+        unique, first, inverse = np.unique(hashes, return_index=True, return_inverse=True)
+
+        with self.lock:
+            labels = np.array([self.memo.get(key) for key in unique.tolist()], dtype=object)
+
+        # Score the new texts only, one batch per worker task
+        missing = np.flatnonzero(pd.isna(labels))
+        if len(missing):
+            new_texts = texts.iloc[first[missing]].tolist()
+            batches = [new_texts[start:start + SCORE_BATCH] for start in range(0, len(new_texts), SCORE_BATCH)]
+            labels[missing] = np.concatenate(map_queries(label_texts, batches, kind=config.CPU_EXECUTOR))
+
+            with self.lock:
+                if len(self.memo) > MEMO_MAX_ITEMS:
+                    self.memo.clear()
+                self.memo.update(zip(unique[missing].tolist(), labels[missing]))
+
+        return pd.Series(labels[inverse], index=texts.index)
+
+
+SENTIMENT_SCORER = SentimentScorer()
+
+
+def fill_sentiment(df, rescore=False):
+    # Score the tweets without a sentiment label
+    if config.SENTIMENT_COL not in df:
+        df[config.SENTIMENT_COL] = None
+
+    missing = df[config.SENTIMENT_COL].isna().to_numpy() | rescore
+    if missing.any():
+        labels = SENTIMENT_SCORER.score(df[config.TEXT_CLEAN_COL][missing])
+        sentiment = df[config.SENTIMENT_COL].astype(object).to_numpy()
+        sentiment[missing] = labels.to_numpy()
+        df[config.SENTIMENT_COL] = sentiment
+
+    return df
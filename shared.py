@@ -0,0 +1,77 @@
+import os
+import tempfile
+
+import pandas as pd
+import pyarrow as pa
+
+import config
+from cache import replacing
+
+
+"""
+==================================================================================
+Shared Dataset
+==================================================================================
+
+Share one copy of the loaded dataset between every server process on the machine.
+The first process that needs a dataset version writes it as an uncompressed Arrow
+IPC file in shared memory (`/dev/shm`). Every process, including the first one, then
+memory-maps the file and reads its columns without copying them, so numeric columns,
+the codes of categorical columns and text columns (as Arrow backed strings) point
+straight into the shared pages and are read-only. Boolean columns, one byte per row,
+are still materialized per process.
+
+Files of older dataset versions are removed when a new version is published. Processes
+that still map an old file keep reading it until they reload.
+
+"""
+
+
+def shared_dir():
+    # Fall back to the temp directory where /dev/shm does not exist
+    if os.path.isdir(os.path.dirname(config.SHARED_DATA_DIR)):
+        return config.SHARED_DATA_DIR
+    return os.path.join(tempfile.gettempdir(), os.path.basename(config.SHARED_DATA_DIR))
+
+
+def shared_path(version):
+    return os.path.join(shared_dir(), f"dataset-{version}.arrow")
+
+
+def publish(df, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=True)
+
+    # Write to a temporary file first so no process maps a partial file
+    with replacing(path) as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+    # Remove older versions
+    for name in os.listdir(os.path.dirname(path)):
+        old_path = os.path.join(os.path.dirname(path), name)
+        if name.startswith("dataset-") and name.endswith(".arrow") and old_path != path:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+
+
+def arrow_types(data_type):
+    # Text stays in the mapped Arrow buffers instead of one Python string per row
+    if pa.types.is_string(data_type) or pa.types.is_large_string(data_type):
+        return pd.StringDtype("pyarrow")
+    return None
+
+
+def attach(path):
+    table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    return table.to_pandas(split_blocks=True, types_mapper=arrow_types)
+
+
+def load_shared(version, read):
+    path = shared_path(version)
+    if not os.path.exists(path):
+        publish(read(), path)
+
+    return attach(path)
@@ -0,0 +1,93 @@
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+
+import config
+from cache import dataset_version
+from cleaning import load_stopword_set
+
+
+"""
+==================================================================================
+Result Store
+==================================================================================
+
+Disk backed store of per-query results, shared by every session and kept across
+server restarts. Results are keyed by dataset version, result kind and normalized
+query, e.g. the metric row, the daily trends or the wordcloud frequencies of a single
+query. A query set is assembled from the stored pieces, so only queries that were
+never searched before are computed.
+
+The version of a result is the dataset version, `STORE_FORMAT` and a fingerprint of
+the other inputs of the results: the lexicon, slang and word cloud mask files, the
+stopwords and the config values in `FINGERPRINT_CONFIG`. Bump `STORE_FORMAT` when a
+change of the code changes stored results. Results of older versions are removed
+when new results are stored.
+
+"""
+
+STORE_FORMAT = 3
+FINGERPRINT_FILES = [config.SENTIMENT_LEXICON_PATH, config.SLANG_PATH, config.WORDCLOUD_MASK_PATH]
+FINGERPRINT_CONFIG = ["DEDUP_SIMILARITY", "INFLUENCE_TOP_K", "NETWORK_MAX_NODES"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    version TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    query TEXT NOT NULL,
+    value BLOB NOT NULL,
+    PRIMARY KEY (version, kind, query)
+)
+"""
+
+
+def store_version(dataset):
+    # Input files by size and modification time, like the dataset
+    inputs = [str(STORE_FORMAT)] + [dataset_version(path) for path in FINGERPRINT_FILES]
+    inputs += [repr(getattr(config, name)) for name in FINGERPRINT_CONFIG]
+    inputs += sorted(load_stopword_set())
+
+    fingerprint = hashlib.sha1("\n".join(inputs).encode("utf-8")).hexdigest()[:16]
+    return f"{dataset}:{fingerprint}"
+
+
+class ResultStore:
+
+    def __init__(self, path=config.STORE_PATH):
+        self.path = path
+        self.conn = None
+        self.lock = threading.Lock()
+
+    def connect(self):
+        if self.conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(SCHEMA)
+        return self.conn
+
+    def get_many(self, version, kind, queries):
+        queries = list(queries)
+        if not queries:
+            return {}
+
+        placeholders = ",".join("?" * len(queries))
+        with self.lock:
+            rows = self.connect().execute(
+                f"SELECT query, value FROM results WHERE version = ? AND kind = ? AND query IN ({placeholders})",
+                [version, kind] + queries).fetchall()
+
+        return {query: pickle.loads(value) for query, value in rows}
+
+    def put_many(self, version, kind, items):
+        rows = [(version, kind, query, pickle.dumps(value)) for query, value in items.items()]
+        with self.lock:
+            conn = self.connect()
+            with conn:
+                conn.execute("DELETE FROM results WHERE version != ?", [version])
+                conn.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)", rows)
+
+
+RESULT_STORE = ResultStore()
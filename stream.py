@@ -0,0 +1,203 @@
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+import config
+from cache import data_path
+from cleaning import fill_cleaned
+from matcher import match_queries, query_mask
+from metrics import COUNT_ITEMS, count_users, query_metric, tweet_counts, tweet_trends
+from ranges import date_bounds
+from sentiment import fill_sentiment
+from utils import replace_wspace
+
+
+"""
+==================================================================================
+Streaming Aggregation
+==================================================================================
+
+Aggregate datasets that do not fit in memory. The dataset is read one row group of
+the columnar file (or one csv chunk) at a time, every chunk is matched and reduced to
+partials, and the partials are merged, so memory is bound by the chunk size and the
+size of the results instead of the dataset.
+
+- trends, public metrics and tweet counts are sums, merged by adding them
+- user counts need the unique users of every query, `UserSet` keeps the first tweet
+  of every (query, user) pair and merges exactly by keeping the earliest one
+- tweet pages and word cloud tweets keep the best k rows of every query, `TopRows`
+  merges by ranking the candidates of both sides again
+
+Rows are ordered by date and then by their position in the file, the same order as
+the loaded dataset. Tweets without a cleaned text or a sentiment label are cleaned
+and labeled chunk by chunk, like the loaded dataset.
+
+"""
+
+STREAM_COLS = [
+    config.TEXT_COL, config.TEXT_CLEAN_COL, config.USER_ID_COL, config.USERNAME_COL, config.USER_FOLLOWERS_COL,
+    config.SENSITIVE_COL, config.SENTIMENT_COL,
+] + config.METRIC_COLS
+ROW_COL = "row"
+
+
+def read_chunks(columns=STREAM_COLS, date_range=None):
+    columns = [config.DATE_COL] + list(columns)
+
+    # Raw dumps may come without cleaned texts or sentiment labels
+    if data_path() == config.COLUMNAR_PATH:
+        parquet = pq.ParquetFile(config.COLUMNAR_PATH)
+        present = [col for col in columns if col in parquet.schema_arrow.names]
+        chunks = (parquet.read_row_group(i, columns=present).to_pandas() for i in range(parquet.num_row_groups))
+    else:
+        header = pd.read_csv(config.DATA_PATH, nrows=0).columns
+        present = [col for col in columns if col in header]
+        chunks = pd.read_csv(
+            config.DATA_PATH, usecols=present, parse_dates=[config.DATE_COL], chunksize=config.ROW_GROUP_SIZE)
+
+    first_row = 0
+    for chunk in chunks:
+        # Clean and label fresh tweets, same as the loaded dataset
+        if config.TEXT_CLEAN_COL in columns:
+            chunk = fill_cleaned(chunk)
+        if config.SENTIMENT_COL in columns:
+            chunk = fill_sentiment(chunk)
+
+        # Remember the file position to break ties between equal dates
+        chunk[ROW_COL] = np.arange(first_row, first_row + len(chunk))
+        first_row += len(chunk)
+        chunk = chunk.set_index(config.DATE_COL).sort_index(kind="mergesort")
+
+        if date_range is not None:
+            start, end = date_bounds(date_range, chunk.index.tz)
+            chunk = chunk[(chunk.index >= start) & (chunk.index < end)]
+
+        if len(chunk):
+            yield chunk
+
+
+def stream_dates():
+    start, end = None, None
+    for chunk in read_chunks(columns=[]):
+        start = chunk.index[0] if start is None else min(start, chunk.index[0])
+        end = chunk.index[-1] if end is None else max(end, chunk.index[-1])
+
+    return start, end
+
+
+def earliest_first(frame):
+    order = np.lexsort((frame[ROW_COL].to_numpy(), frame[config.DATE_COL].to_numpy()))
+    return frame.iloc[order]
+
+
+class UserSet:
+
+    def __init__(self):
+        self.users = None
+
+    def add(self, chunk, matches):
+        # First tweet of every (query, user) pair in the chunk
+        rows, cols = np.nonzero(matches)
+        users = chunk[[config.USER_ID_COL, config.USER_FOLLOWERS_COL, ROW_COL]].iloc[rows].assign(query=cols)
+        users = users.drop_duplicates(subset=["query", config.USER_ID_COL])
+        self.merge_users(users.rename_axis(config.DATE_COL).reset_index())
+
+    def merge_users(self, users):
+        if self.users is not None:
+            users = pd.concat([self.users, users], ignore_index=True)
+        self.users = earliest_first(users).drop_duplicates(subset=["query", config.USER_ID_COL])
+
+    def merge(self, other):
+        if other.users is not None:
+            self.merge_users(other.users)
+        return self
+
+
+class TopRows:
+
+    def __init__(self, k, ascending):
+        self.k = k
+        self.ascending = ascending
+        self.rows = None
+
+    def add(self, rows):
+        rows = rows.rename_axis(config.DATE_COL).reset_index()
+        if self.rows is not None:
+            rows = pd.concat([self.rows, rows], ignore_index=True)
+
+        # Rank by replies, then by date and file position
+        rows = rows.sort_values(
+            [config.REPLY_COL, config.DATE_COL, ROW_COL], ascending=[self.ascending, True, True], kind="mergesort")
+        self.rows = rows.head(self.k).reset_index(drop=True)
+
+    def merge(self, other):
+        if other.rows is not None:
+            self.add(other.rows.set_index(config.DATE_COL))
+        return self
+
+
+class QueryPartials:
+
+    def __init__(self, queries, period):
+        self.queries = queries
+        self.period = period
+        self.trends = None
+        self.metrics = None
+        self.counts = None
+        self.users = UserSet()
+
+    def add(self, chunk, matches):
+        trends = tweet_trends(self.period, self.queries, chunk, matches).drop(columns="date")
+        metrics = query_metric(self.queries, chunk, matches)
+        counts = tweet_counts(chunk, self.queries, matches)
+
+        self.trends = trends if self.trends is None else self.trends.add(trends, fill_value=0)
+        self.metrics = metrics if self.metrics is None else self.metrics + metrics
+        self.counts = counts if self.counts is None else self.counts + counts
+        self.users.add(chunk, matches[self.queries].to_numpy())
+
+    def metric_data(self):
+        counts = pd.concat([self.counts, count_users(self.users.users, self.queries)], axis=1)
+        metric_count_df = pd.concat([self.metrics, counts.round().astype(np.int64)], axis=1)
+        return metric_count_df[config.METRIC_COLS + list(COUNT_ITEMS)]
+
+    def trends_data(self):
+        # Days without tweets in any chunk are zero
+        trends = self.trends.sort_index().asfreq(self.period, fill_value=0).astype(np.int64)
+        trends["date"] = trends.index
+        return trends
+
+    def result(self):
+        # No tweets added yet
+        if self.metrics is None:
+            metric_df = pd.DataFrame(0, index=self.queries, columns=config.METRIC_COLS + list(COUNT_ITEMS))
+            trends_df = pd.DataFrame(columns=[replace_wspace(query) for query in self.queries] + ["date"])
+            return metric_df, trends_df
+
+        return self.metric_data(), self.trends_data()
+
+
+def stream_query_data(queries, period="1D", date_range=None):
+    partials = QueryPartials(queries, period)
+    for chunk in read_chunks(date_range=date_range):
+        partials.add(chunk, match_queries(chunk[config.TEXT_COL], queries))
+
+    return partials.result()
+
+
+def stream_top_rows(queries, k, ascending=False, date_range=None):
+    tops = [TopRows(k, ascending) for _ in queries]
+    for chunk in read_chunks(date_range=date_range):
+        matches = match_queries(chunk[config.TEXT_COL], queries)
+        chunk = chunk.assign(**{col: chunk[col].fillna(0) for col in config.METRIC_COLS})
+
+        for top, query in zip(tops, queries):
+            candidates = chunk[query_mask(matches, query)]
+            if ascending:
+                top.add(candidates.nsmallest(k, config.REPLY_COL, keep="all"))
+            else:
+                top.add(candidates.nlargest(k, config.REPLY_COL, keep="all"))
+
+    # Queries without tweets in range keep a date index, like the loaded dataset
+    empty = pd.DataFrame(columns=STREAM_COLS, index=pd.DatetimeIndex([], name=config.DATE_COL))
+    return [top.rows.set_index(config.DATE_COL) if top.rows is not None else empty for top in tops]
@@ -0,0 +1,131 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+import config
+
+
+"""
+==================================================================================
+Synthetic Tweets
+==================================================================================
+
+Generate tweets with the schema of `labeled.csv` for benchmarks and load tests:
+- Indonesian-like text built from stopwords, topic words, politician names,
+  hashtags and mentions, `full_text_cleaned` drops the stopwords and mentions
+- user activity and followers follow heavy tailed distributions
+- part of the tweets reply to a recent earlier tweet, so reply chains form threads
+- public metrics are heavy tailed and sentiment labels are skewed to neutral
+
+Rows are generated in chunks with increasing dates, the same seed always gives the
+same dataset.
+
+Usage:
+    python synthetic.py --rows 1000000 [--out src/csv/labeled.csv] [--seed 0]
+
+"""
+
+STOPWORDS = "yang dan di ini itu untuk dengan ke dari tidak ada juga akan sudah saja kita".split()
+TOPIC_WORDS = (
+    "presiden pilpres rakyat jakarta korupsi pemilu partai dukung kampanye debat calon suara "
+    "harga minyak banjir macet vaksin ekonomi kerja bagus buruk hebat gagal janji bangga"
+).split()
+NAMES = "anies baswedan ganjar pranowo prabowo subianto sandiaga uno ridwan kamil puan maharani".split()
+HASHTAGS = ["#pilpres2024", "#indonesia", "#jakarta", "#pemilu", "#rakyat"]
+
+REPLY_RATE = 0.4
+SENSITIVE_RATE = 0.05
+SENTIMENTS = ["positive", "neutral", "negative"]
+SENTIMENT_WEIGHTS = [0.25, 0.5, 0.25]
+WORDS_PER_TWEET = (6, 30)
+START_DATE = "2022-01-01"
+SECONDS_PER_TWEET = 2
+
+
+def word_table(n_users):
+    # Stopwords first, they are the most frequent words
+    words = STOPWORDS + TOPIC_WORDS + NAMES + HASHTAGS + [f"@user{i}" for i in range(min(n_users, 1000))]
+    weights = np.r_[
+        np.full(len(STOPWORDS), 8.0), np.full(len(TOPIC_WORDS), 2.0), np.full(len(NAMES), 3.0),
+        np.full(len(HASHTAGS), 1.0), np.full(len(words) - len(STOPWORDS + TOPIC_WORDS + NAMES + HASHTAGS), 0.05)]
+    cleaned = np.array([word not in STOPWORDS and not word.startswith("@") for word in words])
+
+    return np.array(words, dtype=object), weights / weights.sum(), cleaned
+
+
+def user_table(n_users, rng):
+    # A few users write most tweets and have most followers
+    activity = rng.pareto(1.2, n_users) + 1
+    followers = rng.lognormal(5, 2, n_users).astype(np.int64)
+    return activity / activity.sum(), followers
+
+
+def make_texts(n_rows, words, weights, cleaned, rng):
+    lengths = rng.integers(*WORDS_PER_TWEET, n_rows)
+    tokens = rng.choice(len(words), size=lengths.sum(), p=weights)
+    bounds = np.r_[0, np.cumsum(lengths)]
+
+    texts, texts_cleaned = [], []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        tweet = tokens[start:end]
+        texts.append(" ".join(words[tweet]))
+        texts_cleaned.append(" ".join(words[tweet[cleaned[tweet]]]))
+
+    return texts, texts_cleaned
+
+
+def generate_tweets(n_rows, n_users=None, seed=0, first_row=0):
+    rng = np.random.default_rng([seed, first_row])
+    n_users = n_users or max(n_rows // 20, 100)
+    words, weights, cleaned = word_table(n_users)
+    activity, followers = user_table(n_users, np.random.default_rng(seed))
+
+    rows = np.arange(first_row, first_row + n_rows)
+    users = rng.choice(n_users, size=n_rows, p=activity)
+    texts, texts_cleaned = make_texts(n_rows, words, weights, cleaned, rng)
+
+    # Reply to a recent tweet of the same chunk
+    is_reply = (rng.random(n_rows) < REPLY_RATE) & (rows > first_row)
+    parents = np.maximum(np.arange(n_rows) - rng.geometric(0.01, n_rows), 0)
+    reply_users = np.where(is_reply, users[parents], -1)
+
+    names = np.array([f"user{i}" for i in range(n_users)], dtype=object)
+    return pd.DataFrame({
+        config.DATE_COL: pd.Timestamp(START_DATE) + pd.to_timedelta(rows * SECONDS_PER_TWEET, unit="s"),
+        config.ID_COL: 10 ** 17 + rows,
+        config.TEXT_COL: texts,
+        config.TEXT_CLEAN_COL: texts_cleaned,
+        config.USER_ID_COL: 10 ** 9 + users,
+        config.USERNAME_COL: names[users],
+        config.USER_FOLLOWERS_COL: followers[users],
+        config.RETWEET_COL: (rng.pareto(1.5, n_rows) * 20).astype(np.int64),
+        config.REPLY_COL: (rng.pareto(1.5, n_rows) * 10).astype(np.int64),
+        config.LIKE_COL: (rng.pareto(1.5, n_rows) * 50).astype(np.int64),
+        config.QUOTE_COL: (rng.pareto(2.0, n_rows) * 2).astype(np.int64),
+        config.SENSITIVE_COL: rng.random(n_rows) < SENSITIVE_RATE,
+        config.SENTIMENT_COL: rng.choice(SENTIMENTS, size=n_rows, p=SENTIMENT_WEIGHTS),
+        config.REPLY_TO_USERNAME_COL: np.where(is_reply, names[np.maximum(reply_users, 0)], None),
+        config.REPLY_TO_ID_COL: pd.arrays.IntegerArray(10 ** 17 + first_row + parents, ~is_reply),
+    })
+
+
+def write_csv(path, n_rows, n_users=None, seed=0, chunksize=config.ROW_GROUP_SIZE):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    n_users = n_users or max(n_rows // 20, 100)
+
+    for first_row in range(0, n_rows, chunksize):
+        chunk = generate_tweets(min(chunksize, n_rows - first_row), n_users, seed, first_row)
+        chunk.to_csv(path, mode="w" if first_row == 0 else "a", header=first_row == 0, index=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic tweets with the labeled csv schema")
+    parser.add_argument("--rows", type=int, required=True)
+    parser.add_argument("--users", type=int, default=None)
+    parser.add_argument("--out", default=config.DATA_PATH)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    write_csv(args.out, args.rows, args.users, args.seed)
@@ -0,0 +1,155 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+
+import pandas as pd
+
+import config
+from cache import RESULT_CACHE, replacing
+
+
+"""
+==================================================================================
+Telemetry
+==================================================================================
+
+Lightweight spans around the page functions, loaders and aggregations. A span
+records:
+- wall_ms   : wall time of the call, including its child spans
+- rows      : rows of the DataFrame or Series argument, zero when the call was
+              answered from the result cache only
+- hits      : result cache hits during the call
+- misses    : result cache misses during the call
+- mem_mb    : change of the process resident memory
+
+Spans nest per thread, the spans of one page run are kept until the next run and
+shown on the debug sidebar panel. When the outermost span ends its spans are appended
+to `config.TELEMETRY_PATH` as JSON lines and the totals per span name are written to
+`config.TELEMETRY_METRICS_PATH` in the Prometheus text format. The spans file is
+rotated to `<path>.1` once it grows past `config.TELEMETRY_MAX_BYTES`, so at most two
+files are kept. Telemetry is off unless `config.TELEMETRY` is set.
+
+Cache counters are process wide, concurrent sessions show up in each other's spans.
+Work fanned out to the worker pools is timed in the parent span only.
+
+"""
+
+local = threading.local()
+totals = defaultdict(lambda: {"calls": 0, "seconds": 0.0, "rows": 0})
+totals_lock = threading.Lock()
+
+
+def rss_bytes():
+    # Resident set size, only available on linux
+    try:
+        with open("/proc/self/statm", "r") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def input_rows(args):
+    for arg in args:
+        if isinstance(arg, (pd.DataFrame, pd.Series)):
+            return len(arg)
+    return 0
+
+
+@contextmanager
+def span(name, rows=0):
+    if not config.TELEMETRY:
+        yield None
+        return
+
+    stack = local.__dict__.setdefault("stack", [])
+    if not stack:
+        local.records = []
+
+    record = {"name": name, "depth": len(stack), "start": time.time()}
+    local.records.append(record)
+    stack.append(record)
+
+    hits, misses, rss = RESULT_CACHE.hits, RESULT_CACHE.misses, rss_bytes()
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["wall_ms"] = 1000 * (time.perf_counter() - start)
+        record["hits"] = RESULT_CACHE.hits - hits
+        record["misses"] = RESULT_CACHE.misses - misses
+        record["rows"] = 0 if record["hits"] and not record["misses"] else rows
+        record["mem_mb"] = (rss_bytes() - rss) / 1024 ** 2
+        stack.pop()
+
+        with totals_lock:
+            totals[name]["calls"] += 1
+            totals[name]["seconds"] += record["wall_ms"] / 1000
+            totals[name]["rows"] += record["rows"]
+
+        # Outermost span, the run is complete
+        if not stack:
+            local.last_run = local.records
+            write_run(local.records)
+
+
+def traced(func):
+    name = f"{func.__module__}.{func.__qualname__}"
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with span(name, rows=input_rows(args)):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def last_run():
+    return getattr(local, "last_run", [])
+
+
+def rotate(path, max_bytes):
+    # Keep the previous file only, older spans are dropped
+    try:
+        if os.path.getsize(path) > max_bytes:
+            os.replace(path, f"{path}.1")
+    except FileNotFoundError:
+        pass
+
+
+def write_run(records):
+    try:
+        os.makedirs(os.path.dirname(config.TELEMETRY_PATH), exist_ok=True)
+        rotate(config.TELEMETRY_PATH, config.TELEMETRY_MAX_BYTES)
+        with open(config.TELEMETRY_PATH, "a") as spans_file:
+            spans_file.writelines(json.dumps(record) + "\n" for record in records)
+        write_metrics(config.TELEMETRY_METRICS_PATH)
+    except OSError:
+        pass
+
+
+def write_metrics(path):
+    with totals_lock:
+        snapshot = {name: dict(values) for name, values in totals.items()}
+
+    lines = []
+    for metric, key in [("span_calls_total", "calls"), ("span_seconds_total", "seconds"), ("span_rows_total", "rows")]:
+        lines.append(f"# TYPE {metric} counter")
+        lines += [f'{metric}{{span="{name}"}} {values[key]}' for name, values in sorted(snapshot.items())]
+
+    stats = RESULT_CACHE.stats()
+    lines += [
+        "# TYPE result_cache_hits_total counter",
+        f"result_cache_hits_total {stats['hits']}",
+        "# TYPE result_cache_misses_total counter",
+        f"result_cache_misses_total {stats['misses']}",
+        "# TYPE result_cache_bytes gauge",
+        f"result_cache_bytes {stats['bytes']}",
+    ]
+
+    # Replace the file at once, scrapers never read a partial file
+    with replacing(path, "w") as metrics_file:
+        metrics_file.write("\n".join(lines) + "\n")
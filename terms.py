@@ -0,0 +1,102 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+import config
+from cache import replacing
+
+
+"""
+==================================================================================
+Term Frequencies
+==================================================================================
+
+Term frequency vectors of `full_text_cleaned`, built once per dataset version and
+stored as a sparse rows-by-terms matrix with one row per near-duplicate cluster (see
+`dedup`). The word frequencies of a query are the sum of the cluster vectors of its
+tweets weighted by their tweet counts, which are fed straight into
+`WordCloud.generate_from_frequencies`, so the text is never joined and tokenized again
+on a page view.
+
+Terms follow the default WordCloud tokenizer, numbers and stopwords are removed.
+Bigram collocations are not counted.
+
+"""
+
+TERM_PATTERN = r"\w[\w']*"
+TERMS_FORMAT = 2
+WORDCLOUD_TWEETS = 200
+
+
+class TermMatrix:
+
+    def __init__(self, vocab, matrix, version=None):
+        self.vocab = vocab
+        self.matrix = matrix
+        self.version = version
+
+    def __sizeof__(self):
+        matrix = self.matrix
+        return self.vocab.nbytes + matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+
+    def frequencies(self, rows, weights=None):
+        # Weighted rows stand for several tweets with the same text
+        if weights is None:
+            counts = np.asarray(self.matrix[rows].sum(axis=0)).ravel()
+        else:
+            counts = np.asarray(self.matrix[rows].T @ weights).ravel()
+        terms = np.flatnonzero(counts)
+        return dict(zip(self.vocab[terms].tolist(), counts[terms].tolist()))
+
+    def save(self, path):
+        # Replace the files at once, readers never see a partial file
+        os.makedirs(path, exist_ok=True)
+        with replacing(os.path.join(path, "terms_vocab.npy")) as vocab_file:
+            np.save(vocab_file, self.vocab)
+        with replacing(os.path.join(path, "terms.npz")) as matrix_file:
+            sparse.save_npz(matrix_file, self.matrix)
+
+        with replacing(os.path.join(path, "terms_meta.json"), "w") as meta_file:
+            json.dump({"version": self.version, "format": TERMS_FORMAT}, meta_file)
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(os.path.join(path, "terms_meta.json"), "r") as meta_file:
+                meta = json.load(meta_file)
+            if meta.get("format") != TERMS_FORMAT:
+                return None
+
+            vocab = np.load(os.path.join(path, "terms_vocab.npy"))
+            matrix = sparse.load_npz(os.path.join(path, "terms.npz")).tocsr()
+        except (OSError, ValueError, KeyError):
+            return None
+
+        return cls(vocab, matrix, version=meta["version"])
+
+
+def query_rows(filter, df):
+    # Positions of the tweets used for the word cloud
+    positions = np.flatnonzero(filter)
+    order = np.argsort(df[config.REPLY_COL].to_numpy()[positions], kind="stable")
+    return positions[order[:WORDCLOUD_TWEETS]]
+
+
+def build_terms(df, stopwords, version=None):
+    stopwords = frozenset(word.lower() for word in stopwords)
+
+    # Pair every row id with each of its terms
+    tokens = df[config.TEXT_CLEAN_COL].fillna("").str.lower().str.findall(TERM_PATTERN)
+    pairs = pd.DataFrame({"row": np.arange(len(df)), "term": tokens.to_numpy()}).explode("term").dropna()
+    pairs = pairs[~pairs["term"].isin(stopwords) & ~pairs["term"].str.isdigit()]
+
+    # Count the terms of every row
+    codes, vocab = pd.factorize(pairs["term"], sort=True)
+    values = np.ones(len(codes), dtype=np.int32)
+    matrix = sparse.csr_matrix((values, (pairs["row"].to_numpy(), codes)), shape=(len(df), len(vocab)))
+    matrix.sum_duplicates()
+
+    return TermMatrix(np.array(vocab, dtype=str), matrix, version=version)
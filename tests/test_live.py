@@ -0,0 +1,52 @@
+import json
+
+import config
+from live import LiveFeed
+
+
+"""
+==================================================================================
+Live Feed
+==================================================================================
+
+Tweets that do not fit the dataset schema are skipped and the rest of their batch is
+still consumed, so one bad tweet never stalls the feed.
+
+"""
+
+
+def tweet(i, user_id=None):
+    return {
+        "created_at": f"2022-01-01T00:00:{i:02d}Z",
+        "id_str": str(10 ** 17 + i),
+        "full_text": f"anies baswedan {i}",
+        "user": {"id": i if user_id is None else user_id, "screen_name": f"user{i}", "followers_count": 10},
+        "retweet_count": i,
+    }
+
+
+def test_bad_tweet_is_skipped(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "LIVE_BATCH_SIZE", 100)
+    path = tmp_path / "feed.jsonl"
+    tweets = [tweet(0, user_id="not-a-number")] + [tweet(i) for i in range(1, 6)]
+    path.write_text("".join(json.dumps(record) + "\n" for record in tweets) + "not json\n")
+
+    feed = LiveFeed(str(path))
+    feed.poll()
+
+    assert feed.rows == 5
+    assert feed.tail.offset == path.stat().st_size
+    assert sorted(feed.batches[0][config.RETWEET_COL]) == [1, 2, 3, 4, 5]
+
+
+def test_feed_continues_after_bad_tweet(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "LIVE_BATCH_SIZE", 2)
+    path = tmp_path / "feed.jsonl"
+    tweets = [tweet(1), tweet(2, user_id="not-a-number"), tweet(3), tweet(4)]
+    path.write_text("".join(json.dumps(record) + "\n" for record in tweets))
+
+    feed = LiveFeed(str(path), first_row=100)
+    feed.poll()
+
+    assert feed.rows == 3
+    assert feed.next_row == 103
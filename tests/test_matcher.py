@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import config
+from matcher import match_queries
+from synthetic import generate_tweets
+from token_index import MAX_TOKEN_BYTES, build_index
+
+
+"""
+==================================================================================
+Query Matcher
+==================================================================================
+
+The token index only narrows down the rows to verify, so matching with the index
+gives the same rows as a scan of the text for every query.
+
+"""
+
+LONG_TOKEN = "pneumonoultramicroscopicsilicovolcanoconiosis"
+
+TEXTS = [
+    "Dukung #AniesBaswedan jadi presiden",
+    "anies baswedan di jakarta",
+    "Pak ANIES dan @ganjarpranowo",
+    f"kata {LONG_TOKEN} panjang sekali",
+    f"{LONG_TOKEN.upper()}!!",
+    "harga minyak naik lagi... .* bukan regex",
+    "#pemilu2024 #pemilu",
+    "email: anies@example.com",
+    "café résumé naïve",
+    None,
+    "",
+]
+
+QUERIES = [
+    "anies",
+    "Baswedan",
+    "nies bas",
+    "#aniesbaswedan",
+    "#anies",
+    "@ganjarpranowo",
+    "ganjar",
+    LONG_TOKEN,
+    LONG_TOKEN[10:40],
+    "volcano",
+    f"kata {LONG_TOKEN[:5]}",
+    ".*",
+    "!!",
+    "...",
+    "#pemilu",
+    "pemilu20",
+    "anies@example",
+    "résumé",
+    "NOT anies",
+    "anies AND NOT #aniesbaswedan",
+    '"harga minyak" OR .*',
+    "(anies OR ganjar) AND presiden",
+]
+
+
+def frame(texts):
+    return pd.DataFrame({
+        config.TEXT_COL: texts,
+        config.TEXT_CLEAN_COL: [text.lower() if text else text for text in texts],
+    })
+
+
+def test_long_token_is_not_in_vocab():
+    assert len(LONG_TOKEN.encode("utf-8")) > MAX_TOKEN_BYTES
+
+    index = build_index(frame(TEXTS))
+    assert LONG_TOKEN.encode("utf-8") not in set(index.vocab.tolist())
+    assert sorted(index.long_rows.tolist()) == [3, 4]
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_index_matches_scan(query):
+    df = frame(TEXTS)
+    index = build_index(df)
+
+    scanned = match_queries(df[config.TEXT_COL], [query])
+    indexed = match_queries(df[config.TEXT_COL], [query], index=index)
+
+    assert (indexed[query].to_numpy() == scanned[query].to_numpy()).all()
+
+
+def test_hashtag_substrings_match():
+    df = frame(TEXTS)
+    matches = match_queries(df[config.TEXT_COL], ["anies", "#anies", "#aniesbaswedan"], index=build_index(df))
+
+    assert np.flatnonzero(matches["anies"]).tolist() == [0, 1, 2, 7]
+    assert np.flatnonzero(matches["#anies"]).tolist() == []
+    assert np.flatnonzero(matches["#aniesbaswedan"]).tolist() == [0]
+
+
+def test_index_matches_scan_on_generated_tweets():
+    df = generate_tweets(2000, seed=3)
+    words = df[config.TEXT_COL].str.split().explode().dropna().unique()[:30]
+    queries = list(words) + [word[1:4] for word in words[:10]] + [f"{words[0]} {words[1]}", ".*"]
+    queries = list(dict.fromkeys(queries))
+
+    scanned = match_queries(df[config.TEXT_COL], queries)
+    indexed = match_queries(df[config.TEXT_COL], queries, index=build_index(df))
+
+    assert (indexed.to_numpy() == scanned.to_numpy()).all()
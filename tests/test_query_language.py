@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+
+from query_language import canonical_query, evaluate_mask, parse_query, query_terms
+
+
+"""
+==================================================================================
+Query Language
+==================================================================================
+
+Parsed queries keep the documented precedence, NOT before AND before OR, and canonical
+queries parse back to the same expression.
+
+"""
+
+
+def term(text):
+    return ("term", text)
+
+
+@pytest.mark.parametrize("query, node", [
+    ("a OR b AND c", ("or", term("a"), ("and", term("b"), term("c")))),
+    ("a AND b OR c", ("or", ("and", term("a"), term("b")), term("c"))),
+    ("NOT a AND b", ("and", ("not", term("a")), term("b"))),
+    ("NOT NOT a", ("not", ("not", term("a")))),
+    ("(a OR b) AND c", ("and", ("or", term("a"), term("b")), term("c"))),
+    ("a OR b OR c", ("or", ("or", term("a"), term("b")), term("c"))),
+])
+def test_precedence(query, node):
+    assert parse_query(query) == node
+
+
+@pytest.mark.parametrize("query, node", [
+    ('"a" "b"', ("and", term("a"), term("b"))),
+    ("a (b OR c)", ("and", term("a"), ("or", term("b"), term("c")))),
+    ("a NOT b", ("and", term("a"), ("not", term("b")))),
+    ('anies baswedan "harga minyak"', ("and", term("anies baswedan"), term("harga minyak"))),
+])
+def test_implicit_and(query, node):
+    assert parse_query(query) == node
+
+
+def test_adjacent_words_form_one_term():
+    assert parse_query("Anies   Baswedan") == term("anies baswedan")
+    assert parse_query("anies or baswedan") == term("anies or baswedan")
+
+
+def test_quoted_phrase_keeps_operators_and_parentheses():
+    assert parse_query('"anies OR (ganjar)"') == term("anies or (ganjar)")
+    assert parse_query('#pemilu AND NOT "harga  minyak"') == ("and", term("#pemilu"), ("not", term("harga minyak")))
+
+
+@pytest.mark.parametrize("query", [
+    "",
+    "   ",
+    '""',
+    '"anies',
+    'anies "baswedan',
+    "(anies OR ganjar",
+    "((anies)",
+    "anies OR ganjar)",
+    "anies)",
+    "AND anies",
+    "anies OR",
+    "NOT",
+    "()",
+])
+def test_invalid_queries_raise(query):
+    with pytest.raises(ValueError):
+        parse_query(query)
+
+
+@pytest.mark.parametrize("query", [
+    "anies",
+    "anies baswedan",
+    "#pemilu",
+    "a OR b AND c",
+    "(a OR b) AND c",
+    "a AND (b OR c)",
+    "NOT (a OR b)",
+    "NOT a AND NOT b",
+    'anies AND "harga (minyak)"',
+    '"anies OR ganjar" OR prabowo',
+    '"anies "',
+    "a OR (b OR c)",
+])
+def test_canonical_query_round_trips(query):
+    node = parse_query(query)
+    text = canonical_query(node)
+
+    assert parse_query(text) == node
+    assert canonical_query(parse_query(text)) == text
+
+
+def test_canonical_query_keeps_plain_terms():
+    assert canonical_query(parse_query("  Anies  Baswedan ")) == "anies baswedan"
+    assert canonical_query(parse_query('"harga (minyak)"')) == '"harga (minyak)"'
+
+
+def test_evaluate_mask():
+    node = parse_query("(a OR b) AND NOT c")
+    term_masks = {
+        "a": np.array([1, 0, 0, 1, 1, 0, 0, 0, 1], dtype=bool),
+        "b": np.array([0, 1, 0, 0, 1, 1, 0, 0, 1], dtype=bool),
+        "c": np.array([0, 0, 0, 1, 0, 1, 1, 0, 1], dtype=bool),
+    }
+    expected = (term_masks["a"] | term_masks["b"]) & ~term_masks["c"]
+
+    assert sorted(set(query_terms(node))) == ["a", "b", "c"]
+    assert (evaluate_mask(node, term_masks, 9) == expected).all()
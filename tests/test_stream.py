@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import config
+from cleaning import fill_cleaned
+from matcher import match_queries
+from metrics import COUNT_ITEMS, all_counts, query_metric, tweet_trends
+from sentiment import fill_sentiment
+from stream import stream_query_data, stream_top_rows
+from synthetic import write_csv
+from token_index import build_index
+
+
+"""
+==================================================================================
+Streaming Parity
+==================================================================================
+
+Streamed trends, metrics and counts of a synthetic dataset equal the in-memory path,
+which matches through the token index like `load_match_data`. The csv is read in
+several small chunks, so partials are merged across chunks. Datasets with unlabeled
+rows and raw dumps without cleaned texts or labels are filled the same way in both.
+
+"""
+
+QUERIES = ["anies", "pilpres", "#pemilu", "ridwan kamil", "prabowo OR ganjar", "korupsi AND NOT jakarta"]
+ROWS = 5000
+
+
+@pytest.fixture(params=["labeled", "partly_labeled", "raw"])
+def dataset(request, tmp_path, monkeypatch):
+    path = str(tmp_path / "labeled.csv")
+    write_csv(path, ROWS, chunksize=1000)
+    monkeypatch.setattr(config, "DATA_PATH", path)
+    monkeypatch.setattr(config, "COLUMNAR_PATH", str(tmp_path / "missing.parquet"))
+    monkeypatch.setattr(config, "ROW_GROUP_SIZE", 700)
+    monkeypatch.setattr(config, "TELEMETRY", False)
+
+    # Unlabeled rows are cleaned and labeled by both paths
+    raw = pd.read_csv(path)
+    if request.param == "partly_labeled":
+        raw.loc[::3, config.SENTIMENT_COL] = None
+        raw.loc[::5, config.TEXT_CLEAN_COL] = None
+    elif request.param == "raw":
+        raw = raw.drop(columns=[config.SENTIMENT_COL, config.TEXT_CLEAN_COL])
+    raw.to_csv(path, index=False)
+
+    df = pd.read_csv(path, parse_dates=[config.DATE_COL], index_col=config.DATE_COL)
+    return fill_sentiment(fill_cleaned(df)).sort_index(kind="mergesort")
+
+
+def test_stream_matches_in_memory(dataset):
+    matches = match_queries(dataset[config.TEXT_COL], QUERIES, build_index(dataset))
+    metric_df, trends_df = stream_query_data(QUERIES, "1H")
+
+    expected_metrics = pd.concat([query_metric(QUERIES, dataset, matches), all_counts(dataset, QUERIES, matches)], axis=1)
+    expected_metrics = expected_metrics[config.METRIC_COLS + list(COUNT_ITEMS)].astype(np.int64)
+    pd.testing.assert_frame_equal(metric_df.astype(np.int64), expected_metrics)
+
+    expected_trends = tweet_trends("1H", QUERIES, dataset, matches)
+    pd.testing.assert_frame_equal(trends_df, expected_trends, check_freq=False, check_names=False)
+
+
+def test_stream_date_range_matches_in_memory(dataset):
+    date_range = (dataset.index[1000].date(), dataset.index[3000].date())
+    metric_df, _ = stream_query_data(QUERIES, "1D", date_range)
+
+    start, end = pd.Timestamp(date_range[0]), pd.Timestamp(date_range[1]) + pd.Timedelta(days=1)
+    in_range = dataset[(dataset.index >= start) & (dataset.index < end)]
+    matches = match_queries(in_range[config.TEXT_COL], QUERIES)
+    counts = all_counts(in_range, QUERIES, matches)
+
+    pd.testing.assert_frame_equal(metric_df[list(COUNT_ITEMS)], counts, check_dtype=False)
+
+
+def test_stream_top_rows_without_tweets_in_range(dataset):
+    date_range = (pd.Timestamp("2030-01-01").date(), pd.Timestamp("2030-01-02").date())
+    rows_list = stream_top_rows(QUERIES, config.TWEETS_PER_PAGE, False, date_range)
+
+    for rows in rows_list:
+        assert len(rows) == 0
+        assert isinstance(rows.index, pd.DatetimeIndex)
+        assert list(rows.index.strftime("%d %B %Y")) == []
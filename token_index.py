@@ -0,0 +1,144 @@
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+import config
+from cache import replacing
+
+
+"""
+==================================================================================
+Token Index
+==================================================================================
+
+Inverted index over the tweet text. Every word of `full_text` and `full_text_cleaned`
+points to a posting list of the row ids that contain it, so a keyword or phrase query
+is answered by intersecting posting lists instead of scanning every row.
+
+The index is stored as four flat arrays and saved as `.npy` files, which are
+memory-mapped back on load:
+- vocab     : sorted utf-8 tokens
+- offsets   : start of each token posting list, `offsets[i]:offsets[i + 1]`
+- postings  : row ids grouped by token, ascending within each token
+- long_rows : row ids with a token longer than `MAX_TOKEN_BYTES`, not in the vocab
+
+The index only narrows down the rows to scan, matches are the same case insensitive
+substrings as a scan of `full_text`. Every word of the query is inside one token of
+a matching tweet, so the candidates are the rows of the tokens that contain every
+query word, e.g. `anies` finds `#aniesbaswedan`. The candidates are then verified
+against `full_text`.
+
+"""
+
+TOKEN_PATTERN = re.compile(r"\w+")
+MAX_TOKEN_BYTES = 32
+INDEX_FILES = ("vocab", "offsets", "postings", "long_rows")
+INDEX_FORMAT = 3
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class TokenIndex:
+
+    def __init__(self, vocab, offsets, postings, long_rows, version=None):
+        self.vocab = vocab
+        self.offsets = offsets
+        self.postings = postings
+        self.long_rows = long_rows
+        self.version = version
+
+    def __sizeof__(self):
+        # Mapped arrays count too, their pages are resident once they are read
+        return self.vocab.nbytes + self.offsets.nbytes + self.postings.nbytes + self.long_rows.nbytes
+
+    def token_rows(self, token):
+        # Rows with a token containing the word, long tokens are always candidates
+        key = token.encode("utf-8")
+        rows = [np.asarray(self.long_rows)]
+        if len(key) <= MAX_TOKEN_BYTES:
+            found = np.flatnonzero(np.char.find(self.vocab, key) >= 0)
+            rows += [self.postings[self.offsets[pos]:self.offsets[pos + 1]] for pos in found]
+        return np.unique(np.concatenate(rows))
+
+    def lookup(self, query):
+        # The index can not answer queries without words
+        tokens = tokenize(query)
+        if not tokens:
+            return None
+
+        # Intersect candidate rows, starting from the shortest list
+        candidates = sorted((self.token_rows(token) for token in set(tokens)), key=len)
+        rows = candidates[0]
+        for other in candidates[1:]:
+            rows = np.intersect1d(rows, other, assume_unique=True)
+
+        return rows
+
+    def search(self, texts, query):
+        rows = self.lookup(query)
+        if rows is None or len(rows) == 0:
+            return rows
+
+        # Verify the substring on the candidate rows only
+        candidates = texts.iloc[rows].fillna("").str.lower()
+        found = candidates.str.contains(query.lower(), regex=False).to_numpy()
+        return rows[found]
+
+    def save(self, path):
+        # Replace the files at once, loaded indexes keep mapping the old ones
+        os.makedirs(path, exist_ok=True)
+        for name in INDEX_FILES:
+            with replacing(os.path.join(path, f"{name}.npy")) as array_file:
+                np.save(array_file, getattr(self, name))
+
+        with replacing(os.path.join(path, "meta.json"), "w") as meta:
+            json.dump({"version": self.version, "format": INDEX_FORMAT}, meta)
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(os.path.join(path, "meta.json"), "r") as meta_file:
+                meta = json.load(meta_file)
+            if meta.get("format") != INDEX_FORMAT:
+                return None
+
+            version = meta["version"]
+            arrays = [np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in INDEX_FILES]
+        except (OSError, ValueError, KeyError):
+            return None
+
+        return cls(*arrays, version=version)
+
+
+def build_index(df, version=None):
+    # Pair every row id with each of its tokens
+    pairs = pd.concat([
+        pd.DataFrame({
+            "row": np.arange(len(df)),
+            "token": df[col].fillna("").str.lower().str.findall(TOKEN_PATTERN.pattern).to_numpy()
+        }).explode("token")
+        for col in (config.TEXT_COL, config.TEXT_CLEAN_COL)
+    ]).dropna()
+
+    # Keep unique pairs of indexable tokens, rows with longer tokens are kept apart
+    pairs["token"] = pairs["token"].str.encode("utf-8")
+    indexable = pairs["token"].str.len() <= MAX_TOKEN_BYTES
+    long_rows = np.unique(pairs["row"][~indexable].to_numpy()).astype(np.int32)
+    pairs = pairs[indexable].drop_duplicates()
+
+    # Group row ids by token
+    codes, vocab = pd.factorize(pairs["token"], sort=True)
+    rows = pairs["row"].to_numpy()
+    order = np.lexsort((rows, codes))
+
+    offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(codes, minlength=len(vocab)))
+    postings = rows[order].astype(np.int32)
+
+    vocab = np.array(vocab, dtype=f"S{MAX_TOKEN_BYTES}")
+    return TokenIndex(vocab, offsets, postings, long_rows, version=version)
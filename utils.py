@@ -1,9 +1,12 @@
 import re
+from io import BytesIO
 from itertools import cycle, accumulate
+from string import Formatter
 
-import streamlit as st
+import pandas as pd
 from bokeh.layouts import row
 from bokeh.palettes import Category10_10
+from jinja2 import Template
 from wordcloud import WordCloud
 
 
@@ -20,39 +23,33 @@ def format_date(row_date):
     return row_date.strftime("%Y-%m-%d")
 
 def replace_wspace(text):
-    return text.replace(" ", "_")
-
-
-@st.cache
-def filter_tweet_count(series, query):
-    return series.str.contains(query, flags=re.IGNORECASE).sum()
-
-@st.cache
-def filter_tweets(df, query):
-    return df.str.contains(query, flags=re.IGNORECASE)
-
+    # Column names of bokeh sources, query operators and quotes are replaced too
+    return re.sub(r"\W", "_", text)
 
 def cumsum_angle(angles):
     return list(accumulate(angles))
 
+def render_template(template, fields):
+    # Fill a template with whole columns instead of formatting row by row
+    rendered = pd.Series("", index=next(iter(fields.values())).index)
+    for literal, field, _, _ in Formatter().parse(template):
+        rendered = rendered + literal
+        if field is not None:
+            rendered = rendered + fields[field].astype(str)
 
-@st.cache(allow_output_mutation=True)
-def make_relations(df, source, target):
-    df = df.copy()
-    relations = df.groupby(source, as_index=False).agg({target: list})
-    return relations
+    return rendered
 
-@st.cache
-def split_relations(relations, target):
-    return relations.explode(target)
 
-def trim_relations(array):
-    return array[:3]
+def render_wordcloud(frequencies, mask):
+    if not frequencies:
+        return None
 
+    wcloud = WordCloud(background_color="white", max_words=1000, mask=mask).generate_from_frequencies(frequencies)
 
-@st.cache
-def gen_wordcloud(text, **kwargs):
-    return WordCloud(**kwargs).generate(text)
+    # Encode as png
+    image = BytesIO()
+    wcloud.to_image().save(image, format="PNG")
+    return image.getvalue()
 
 def join_queries(queries):
     if queries is None:
@@ -75,4 +72,16 @@ def arange_charts(charts, cols=3):
     layouts = []
     for i in range(0, len(charts), cols):
         layouts.append(row(*charts[i:i + cols]))
-    return layouts
\ No newline at end of file
+    return layouts
+
+
+def render_network(network):
+    # Render the pyvis template in memory, save_graph writes to a file
+    with open(network.path, "r") as template:
+        template = Template(template.read())
+
+    nodes, edges, heading, height, width, options = network.get_network_data()
+    return template.render(
+        height=height, width=width, nodes=nodes, edges=edges, heading=heading, options=options,
+        physics_enabled=network.options.physics.enabled, use_DOT=network.use_DOT, dot_lang=network.dot_lang,
+        widget=network.widget, bgcolor=network.bgcolor, conf=network.conf, tooltip_link=False)
@@ -1,12 +1,9 @@
 from math import pi
-from collections import namedtuple
 
-from PIL import Image
 import numpy as np
 import pandas as pd
 import streamlit as st
 import streamlit.components.v1 as components
-import matplotlib.pyplot as plt
 from bokeh.plotting import figure
 from bokeh.layouts import column, row
 from bokeh.transform import cumsum, dodge
@@ -14,25 +11,32 @@ from bokeh.models import (
     Div, DatetimeTickFormatter, Panel, Tabs, NumeralTickFormatter, 
     Label, LabelSet, ColumnDataSource, Legend, LegendItem
     )
+from pyvis.edge import Edge
 from pyvis.network import Network
 
 import config
+from cache import cached
+from graph import prune_edges
+from telemetry import last_run, traced
 from loader import (
-    load_stopwords, load_transformed_charts_data, load_tweet_template, load_data, 
-    load_trends_data, load_metric_data
+    load_transformed_charts_data, load_tweet_template, load_data, 
+    load_trends_data, load_metric_data, load_wordcloud_images, load_relations_data,
+    load_graph, load_influence_data, load_tweet_pages, load_date_bounds, load_live_data
     )
+from live import live_feed
+from matcher import split_queries
+from query_language import parse_query
 from utils import (
     arange_charts, color_generator, format_title, replace_wspace, remove_duplicates, 
-    join_queries, filter_tweets, gen_wordcloud, split_relations, make_relations, trim_relations,
-    cumsum_angle
+    join_queries, cumsum_angle, render_network, render_template
     )
 
 
 # Streamlit settings
 st.set_page_config(layout="wide")
 
-# Load Data
-df = load_data()
+# Load Data, streaming mode never loads the whole dataset
+df = None if config.STREAMING else load_data()
 
 """
 ==================================================================================
@@ -42,17 +46,21 @@ Header
 Includes search bar and logo
 
 """
+@traced
 def show_logo(title):
     st.title(title)
 
+@traced
 def show_search_bar():
     queries = join_queries(st.session_state.get("queries"))
     options = st.text_input(
         label="Masukkan Nama Lengkap", 
         value=queries or "Anies Baswedan, Ganjar Pranowo, Prabowo Subianto, Sandiaga Uno, Ridwan Kamil", 
-        placeholder="Ex: Anies Baswedan, Ganjar Pranowo")
-    return options.split(",")
+        placeholder="Ex: Anies Baswedan, Ganjar Pranowo",
+        help='Pisahkan kata kunci dengan koma. Gunakan AND, OR, NOT, tanda kurung, "frasa", #hashtag dan @mention.')
+    return split_queries(options)
 
+@traced
 def show_descriptions():
     st.write("""
     Harian Kompas merupakan aplikasi analisis sosial yang digunakan untuk melihat 
@@ -64,6 +72,7 @@ def show_descriptions():
     terhadap bahasan tertentu.
     """)
 
+@traced
 def show_home():
     show_logo("Harian Kompas")
     show_descriptions()
@@ -76,9 +85,42 @@ def show_home():
     queries = show_search_bar()
     queries = remove_duplicates(queries)
     if "" not in queries:
+        # Check the query syntax before any data is loaded
+        try:
+            for query in queries:
+                parse_query(query)
+        except ValueError as error:
+            st.error(str(error))
+            return
+
         st.session_state["queries"] = queries
-        st.session_state["metric_df"] = load_metric_data(st.session_state["queries"], df)
-        st.session_state["trends_df"] = load_trends_data(st.session_state["queries"], df)
+        load_query_data()
+
+def load_query_data():
+    queries = st.session_state.get("queries")
+    date_range = st.session_state.get("date_range")
+    # The live feed extends the loaded dataset, streaming mode has none and ignores it
+    if queries and config.LIVE_FEED and df is not None:
+        st.session_state["metric_df"], st.session_state["trends_df"] = load_live_data(queries, df, date_range=date_range)
+    elif queries:
+        st.session_state["metric_df"] = load_metric_data(queries, df, date_range)
+        st.session_state["trends_df"] = load_trends_data(queries, df, date_range=date_range)
+
+@traced
+def show_date_range():
+    min_date, max_date = [date.date() for date in load_date_bounds(df)]
+    date_range = st.sidebar.date_input(
+        label="Rentang Waktu",
+        value=(min_date, max_date),
+        min_value=min_date,
+        max_value=max_date)
+
+    # Keep the previous range until both dates are picked
+    if len(date_range) == 2:
+        date_range = tuple(date_range)
+        st.session_state["date_range"] = None if date_range == (min_date, max_date) else date_range
+
+    load_query_data()
 
 """
 ==================================================================================
@@ -90,6 +132,7 @@ Includes tweet trends and tweet count charts
 """
 
 # Timeline Chart
+@traced
 def show_tweet_trends():
     if st.session_state.get("queries") and st.session_state.get("trends_df") is not None:
         trends = st.session_state["trends_df"]
@@ -114,6 +157,7 @@ def show_tweet_trends():
         st.subheader("")
 
 
+@traced
 def show_tweet_count_chart():
     if st.session_state.get("queries") and st.session_state.get("metric_df") is not None:
         metric_df = st.session_state.get("metric_df")
@@ -129,6 +173,7 @@ def show_tweet_count_chart():
         st.subheader("")
 
 
+@traced
 def show_trend():
     st.subheader("Tweets Trends")
     st.write("""
@@ -208,6 +253,7 @@ def set_text_chart(width, height, value_col, source):
     return chart
 
 
+@traced
 def show_count_analysis_charts():
     if st.session_state.get("queries") and st.session_state.get("metric_df") is not None:
         charts = []
@@ -279,6 +325,7 @@ def set_gauge_chart(row):
     return chart
 
 
+@traced
 def show_sentiment_count_charts():
     if st.session_state.get("queries") and st.session_state.get("metric_df") is not None:
         metric_df = st.session_state.get("metric_df")
@@ -340,6 +387,7 @@ def set_vbar_chart(value_col, tooltips, source):
     return chart
 
 
+@traced
 def show_user_involvement_charts():
     if st.session_state.get("queries") and st.session_state.get("metric_df") is not None:
         charts = []
@@ -371,6 +419,44 @@ def show_user_involvement_charts():
         
 
 
+def set_influence_chart(scores, color):
+    tooltips = [("user", "@user"), ("pagerank", "@pagerank{0.0000}"), ("in_degree", "@in_degree{0,0}"), ("replies", "@replies{0,0}")]
+    chart = figure(
+        width=900, height=450,
+        y_range=list(reversed(scores["user"])),
+        tools=[],
+        tooltips=tooltips)
+
+    chart.hbar(y="user", left=0, right="pagerank", height=0.5, color=color, source=scores)
+    chart.xaxis.axis_label = "PageRank"
+    chart.grid.grid_line_color = None
+    chart.toolbar.logo = None
+
+    return chart
+
+
+@traced
+def show_influence_charts():
+    if config.STREAMING:
+        st.info("Influential Accounts tidak tersedia pada mode streaming")
+    elif st.session_state.get("queries"):
+        queries = st.session_state.get("queries")
+        graph = load_graph(df)
+        scores_list = load_influence_data(queries, df, st.session_state.get("date_range"))
+
+        panels = []
+        for query, color, scores in zip(queries, color_generator(), scores_list):
+            scores = scores.head(config.INFLUENCE_TOP_K).assign(user=lambda top: graph.users[top["user"]])
+            if len(scores):
+                panels.append(Panel(child=set_influence_chart(scores, color), title=query))
+
+        if panels:
+            st.bokeh_chart(Tabs(tabs=panels))
+        else:
+            st.write("Tidak ada balasan antar pengguna pada kata kunci ini")
+
+
+@traced
 def show_public_analysis():
 
     st.subheader("Count Analysis")
@@ -379,6 +465,8 @@ def show_public_analysis():
     yang dimaksud meliputi:
     - **Viral Count**  
       Jumlah tweet yang viral. Tweet dianggap viral apabila jumlah reply, like atau retweet mencapai angka 1,000.
+    - **Users Count**  
+      Jumlah akun unik yang membuat tweet pada kata kunci.
     - **Influencer Count**  
       Jumlah akun influencer. Akun dianggap sebagai influencer apabila jumlah followers yang dimiliki mencapai angka 1,000.
     - **Sensitive Count**
@@ -408,6 +496,20 @@ def show_public_analysis():
     suatu bahasan apakah cenderung positif atau negatif.
     """)
     show_sentiment_count_charts()
+    st.subheader("")
+
+    st.subheader("Influential Accounts")
+    st.markdown("""
+    Influential Accounts merupakan akun yang paling berpengaruh dalam percakapan di setiap kata kunci. Pengaruh
+    akun ditentukan dari graph balasan antar pengguna dengan:
+    - **PageRank**  
+      Skor pengaruh akun, akun yang dibalas oleh akun berpengaruh lain mendapat skor lebih tinggi.
+    - **In Degree**  
+      Jumlah pengguna berbeda yang membalas akun.
+    - **Replies**  
+      Jumlah balasan yang diterima akun.
+    """)
+    show_influence_charts()
 
 """
 ==================================================================================
@@ -417,6 +519,7 @@ Content: Word Clouds
 Includes word cloud on every query
 
 """
+@traced
 def show_wordcloud():
     st.subheader("Word Cloud")
     st.markdown("""
@@ -427,31 +530,14 @@ def show_wordcloud():
 
     if st.session_state.get("queries"):
         queries = st.session_state.get("queries")
-        mask = np.array(Image.open("src/images/twitter.jpg"))
-        stopwords = load_stopwords() + ["yg", "nya"]
+        images = load_wordcloud_images(queries, df, st.session_state.get("date_range"))
         
-        for query in queries:
-            fig = plt.figure(figsize=(8, 8))
-
-            # Filter data
-            filters = filter_tweets(df[config.TEXT_COL], query)
-            sorted_df = df[filters].sort_values(by=[config.REPLY_COL]).head(200)
-            text = sorted_df[config.TEXT_CLEAN_COL].str.cat(sep=" ")
-
-            wcloud = gen_wordcloud(
-                text,
-                background_color="white",
-                max_words=1000,
-                mask=mask,
-                stopwords=stopwords,
-            )
-
-            plt.imshow(wcloud, interpolation="bilinear")
-            plt.axis("off")
-            plt.title(f"{query} words", fontdict=dict(fontsize=10))
+        for query, image in zip(queries, images):
+            if image is None:
+                st.write(f"Tidak ada kata untuk {query}")
+            else:
+                st.image(image, caption=f"{query} words")
 
-            
-            st.pyplot(fig)
             st.subheader("")
 
 
@@ -463,50 +549,37 @@ Content: Tweet Details
 Includes tweet from user
 
 """
+@traced
 def show_tweet_details():
     st.subheader("Tweet Details")
     st.markdown("""
     Tweet Details adalah bentuk asli dari tweet pengguna sosial media itu sendiri.
     """)
-    max_tweets = 30
     
     if st.session_state.get("queries"):
         queries = st.session_state.get("queries")
+        page = st.number_input("Halaman", min_value=1, step=1, key="tweet_page") - 1
+        pages = load_tweet_pages(queries, df, page, st.session_state.get("date_range"))
         panels = []
 
-        for query in queries:
-            tweet_list = []
-
-            # Filter data
-            filter = filter_tweets(df[config.TEXT_COL], query)
-            filtered_df = df[filter]
-
-            # Sort data
-            filtered_df = filtered_df.sort_values(by=[config.REPLY_COL], ascending=False)
-            filtered_df[config.DATE_COL] = filtered_df.index.strftime("%d %B %Y")
-            filtered_df = filtered_df.reset_index(drop=True).fillna(0)
-
-            for index, row in filtered_df.iterrows():
-                if index > max_tweets:
-                    break
-                
-                template = load_tweet_template().format(
-                    name=row[config.USERNAME_COL],
-                    date=row[config.DATE_COL],
-                    content=row[config.TEXT_COL],
-                    sentiment=row[config.SENTIMENT_COL],
-                    reply=int( row[config.REPLY_COL] ),
-                    retweet=int( row[config.RETWEET_COL] ),
-                    like=int( row[config.LIKE_COL] ),
-                )
-
-                tweet_card = Div(
-                    text=template, 
-                    width=900, sizing_mode="scale_width")
-                
-                tweet_list.append(tweet_card)
+        # Format only the tweets of the page
+        for query, page_df in zip(queries, pages):
+            cards = render_template(load_tweet_template(), {
+                "name": page_df[config.USERNAME_COL],
+                "date": pd.Series(page_df.index.strftime("%d %B %Y"), index=page_df.index),
+                "content": page_df[config.TEXT_COL],
+                "sentiment": page_df[config.SENTIMENT_COL],
+                "reply": page_df[config.REPLY_COL].fillna(0).astype(np.int64),
+                "retweet": page_df[config.RETWEET_COL].fillna(0).astype(np.int64),
+                "like": page_df[config.LIKE_COL].fillna(0).astype(np.int64),
+            })
+
+            if len(cards):
+                tweet_cards = Div(text="".join(cards), width=900, sizing_mode="scale_width")
+            else:
+                tweet_cards = Div(text=f"Tidak ada tweet pada halaman {page + 1}", width=900)
 
-            panels.append( Panel(child=column(*tweet_list), title=query) )
+            panels.append( Panel(child=tweet_cards, title=query) )
         
         layouts = Tabs(tabs=panels)
         st.bokeh_chart(layouts)
@@ -520,53 +593,63 @@ Content: Tweet Networks
 Includes tweet networks
 
 """
-@st.cache
-def get_node_edges(df, source, target, queries):
-    Nodes = namedtuple("Node", "name color")
-    Edges = namedtuple("Edge", "root leaf")
-
-    df = df.copy()
-    nodes, edges = [], []
-    for color, q in zip(color_generator(), queries):
-        # Temporary DataFrame
-        filter_query = filter_tweets(df["full_text"], q)
-        temp_df = df[filter_query].sort_values("user.followers_count", ascending=False)
-        
-        # Relations
-        relations = make_relations(temp_df, source, target)
-        relations["counts"] = relations[target].str.len()
-        relations = relations.sort_values("counts", ascending=False).head(100)
-        relations[target] = relations[target].apply(trim_relations)
-        relations = split_relations(relations, target)
-
-        for _, row in relations.iterrows():
-            root = row["in_reply_to_screen_name"]
-            leaf = row["user.screen_name"]
-            
-            nodes.append(Nodes(name=root, color=color))
-            nodes.append(Nodes(name=leaf, color=color))
-            edges.append(Edges(root=root, leaf=leaf))
+@cached
+def get_node_edges(df, queries, date_range=None):
+    graph = load_graph(df)
+    relations_list = load_relations_data(queries, df, date_range)
+    scores = pd.concat(load_influence_data(queries, df, date_range)).groupby("user")["pagerank"].max()
+    edges = pd.concat([
+        relations.assign(color=color) for color, relations in zip(color_generator(), relations_list)
+        ])
+
+    # Users take the color of the first query they appear in
+    nodes = pd.DataFrame({
+        "user": np.concatenate([edges["source"], edges["target"]]),
+        "color": np.concatenate([edges["color"], edges["color"]])
+        }).drop_duplicates("user")
+    nodes["pagerank"] = scores.reindex(nodes["user"], fill_value=0).to_numpy()
+
+    # Merge the edges of all queries, the network is undirected
+    pairs = np.sort(edges[["source", "target"]].to_numpy(), axis=1)
+    edges = pd.DataFrame(pairs, columns=["source", "target"]).assign(weight=edges["weight"].to_numpy())
+    edges = edges.groupby(["source", "target"], as_index=False)["weight"].sum()
+
+    # Back to user names
+    nodes["user"] = graph.users[nodes["user"]]
+    edges["source"] = graph.users[edges["source"]]
+    edges["target"] = graph.users[edges["target"]]
 
     return nodes, edges
 
-def build_network():
+@cached
+def network_html(df, queries, date_range=None):
+    nodes, edges = get_node_edges(df, queries, date_range)
+
+    # Keep the heaviest edges within the node budget
+    edges = prune_edges(edges, config.NETWORK_MAX_NODES)
+    nodes = nodes[nodes["user"].isin(edges["source"]) | nodes["user"].isin(edges["target"])]
 
     social_net = Network(height="600px", width="900px", bgcolor="#111", font_color="#fff", directed=False)
-    nodes, edges = get_node_edges(df, "in_reply_to_screen_name", "user.screen_name", st.session_state.get("queries"))
 
-    for node in nodes:
-        social_net.add_node(node.name, color=node.color, physics=False)
+    # Size users by their influence
+    for user, color, rank in zip(nodes["user"], nodes["color"], nodes["pagerank"]):
+        social_net.add_node(user, color=color, value=float(rank), title=f"PageRank {rank:.4f}", physics=False)
 
-    for edge in edges:
-        social_net.add_edge(edge.root, edge.leaf)
+    # Edges are already unique, skip the duplicate check of add_edge
+    social_net.edges.extend(
+        Edge(source, target, value=int(weight)).options
+        for source, target, weight in zip(edges["source"], edges["target"], edges["weight"])
+        )
 
     social_net.barnes_hut()
-    social_net.save_graph("src/template/social.html")
-    
-    HTMLfile = open("src/template/social.html", "r", encoding="utf-8")
-    components.html(HTMLfile.read(), width=900, height=600)
+    return render_network(social_net)
+
+def build_network():
+    html = network_html(df, st.session_state.get("queries"), st.session_state.get("date_range"))
+    components.html(html, width=900, height=600)
 
 
+@traced
 def show_network():
     st.subheader("Social Network")
     st.write("""
@@ -574,7 +657,9 @@ def show_network():
     Graph merupakan struktur data tidak linier yang terdiri dari node dan edge, yang mana node merepresentasikan
     pengguna dan edge merepresentasikan hubungan antar pengguna.
     """)
-    if st.session_state.get("queries"):
+    if config.STREAMING:
+        st.info("Social Network tidak tersedia pada mode streaming")
+    elif st.session_state.get("queries"):
         template = ""
         for color, q in zip(color_generator(), st.session_state.get("queries")):
             template += """
@@ -586,4 +671,53 @@ def show_network():
             """.format(query=q, color=color)
         st.markdown(template, unsafe_allow_html=True)
         build_network()
-    
\ No newline at end of file
+    
+
+
+"""
+==================================================================================
+Live Status
+==================================================================================
+
+Tweets received from the live feed, shown on the sidebar when `config.LIVE_FEED` is set.
+The status is a fragment that the browser reruns every `config.LIVE_REFRESH_SECONDS`,
+the whole page reruns only when new tweets arrived. Streamlit versions without
+fragments show the new tweets on the next user input.
+
+"""
+def live_status():
+    feed = live_feed(df)
+    updated_at = pd.Timestamp(feed.updated_at, unit="s").strftime("%H:%M:%S") if feed.updated_at else "-"
+    st.caption(f"Live: {feed.rows:,} tweet baru, terakhir {updated_at} UTC")
+
+    # Rerun the page with the new tweets
+    seen = st.session_state.setdefault("live_updated_at", feed.updated_at)
+    if feed.updated_at != seen:
+        st.session_state["live_updated_at"] = feed.updated_at
+        st.rerun()
+
+def show_live_status():
+    if config.LIVE_FEED and df is not None:
+        fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+        with st.sidebar:
+            if fragment is not None and config.LIVE_REFRESH_SECONDS:
+                fragment(live_status, run_every=config.LIVE_REFRESH_SECONDS)()
+            else:
+                live_status()
+
+
+"""
+==================================================================================
+Debug Panel
+==================================================================================
+
+Spans of the last page run, shown on the sidebar when `config.DEBUG_PANEL` is set
+
+"""
+def show_debug_panel():
+    if config.DEBUG_PANEL and last_run():
+        spans = pd.DataFrame(last_run())
+        spans["name"] = ["  " * depth + name for depth, name in zip(spans["depth"], spans["name"])]
+
+        with st.sidebar.expander("Debug"):
+            st.dataframe(spans[["name", "wall_ms", "rows", "hits", "misses", "mem_mb"]].round(2))